@@ -0,0 +1,65 @@
+"""Letter normalization shared by every module.
+
+Raw text (bytes, or str, which is UTF-8 encoded first) is normalized
+once, in a single bytes.translate call that also deletes everything that
+is not an ASCII letter, into bytes of letter indices: 0 for A or a up to
+25 for Z or z. The cipher engine and the analysis code all work on that
+form; NumPy code views it as a uint8 array without copying.
+
+Non-letters and case are not kept in the index string. To put them back,
+keep the raw text: restore() writes new (uppercase) letters into the raw
+text's letter positions, keeping each one's case.
+"""
+
+import string
+
+LETTERS = string.ascii_uppercase
+INDICES = bytes(range(26))
+
+_UPPER = LETTERS.encode('ascii')
+_LOWER = LETTERS.lower().encode('ascii')
+
+# A-Z and a-z map to 0..25 (or to upper/lower case letters); everything
+# else is deleted.
+CODES = bytes.maketrans(_UPPER + _LOWER, INDICES * 2)
+UPPER = bytes.maketrans(_LOWER, _UPPER)
+LOWER = bytes.maketrans(_UPPER, _LOWER)
+NONLETTERS = bytes(b for b in range(256) if not bytes([b]).isalpha())
+
+_TO_UPPER = bytes.maketrans(INDICES, _UPPER)
+_TO_LOWER = bytes.maketrans(INDICES, _LOWER)
+
+
+def _bytes(text):
+    return text.encode('utf-8') if isinstance(text, str) else text
+
+
+def encode(text):
+    """Letter indices of text, non-letters dropped."""
+    return _bytes(text).translate(CODES, NONLETTERS)
+
+
+def decode(codes, lower=False):
+    """Letters (str) for bytes of letter indices."""
+    return bytes(codes).translate(_TO_LOWER if lower else _TO_UPPER).decode('ascii')
+
+
+def clean(text, lower=False):
+    """The letters of text in one case, non-letters dropped, as str."""
+    return _bytes(text).translate(LOWER if lower else UPPER, NONLETTERS).decode('ascii')
+
+
+def restore(letters, raw):
+    """raw with its letters replaced, in order, by the uppercase letters
+    of ``letters``, which must hold one letter per letter of raw.
+
+    Case, spacing and punctuation of raw are kept; the result is str if
+    raw is, bytes otherwise.
+    """
+    import numpy as np
+    data = _bytes(raw)
+    out = np.frombuffer(data, dtype=np.uint8).copy()
+    mask = np.frombuffer(data.translate(UPPER), dtype=np.uint8) - 65 < 26
+    out[mask] = (out[mask] & 0x20) | np.frombuffer(_bytes(letters), dtype=np.uint8)
+    out = out.tobytes()
+    return out.decode('utf-8') if isinstance(raw, str) else out
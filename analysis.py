@@ -0,0 +1,230 @@
+"""Vectorized letter statistics for breaking the Vigenere cipher.
+
+Ciphertext is encoded once as a uint8 array of letter indices (A=0 .. Z=25);
+every count below is a bincount over that array instead of one pass per
+letter.
+
+Beaufort, variant Beaufort and autokey ciphertext (see vigenere.py) is
+analysed through the same column histograms: key_histograms gives the
+counts that a key letter of each variant turns into plaintext, so their
+M_g tables, keys and fits come from the same matrix products.
+"""
+
+import os, mmap
+import numpy as np
+import alphabet, instrument, vigenere
+
+LETTERS = alphabet.LETTERS
+
+# Average letter occurence chances in English text.
+ENGLISH = np.array([
+    .082, .015, .028, .043, .127, .022, .020, .061, .070, .002, .008, .040,
+    .024, .067, .075, .019, .001, .060, .063, .091, .028, .010, .023, .001,
+    .020, .001])
+
+
+NEGATE = (-np.arange(26) % 26).astype(np.uint8)    # letter g to -g mod 26
+
+
+def encode(text):
+    """Letter indices of text as a uint8 array, non-letters dropped."""
+    return np.frombuffer(alphabet.encode(text), dtype=np.uint8)
+
+
+CHUNK_SIZE = 1 << 24    # bytes normalized (or letters counted) per step
+
+
+def load(path, chunk_size=CHUNK_SIZE):
+    """Letter indices of a file, normalized straight from a memory map.
+
+    Each chunk of the map is translated into one preallocated array, so
+    the result (one byte per letter) is the only full-size buffer. Reading
+    a chunk is timed as the load stage and translating it as normalize.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return np.zeros(0, dtype=np.uint8)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        out = np.empty(size, dtype=np.uint8)
+        n = 0
+        for start in range(0, size, chunk_size):
+            with instrument.stage('load'):
+                raw = mm[start:start + chunk_size]
+            with instrument.stage('normalize'):
+                block = alphabet.encode(raw)
+                out[n:n + len(block)] = np.frombuffer(block, dtype=np.uint8)
+            n += len(block)
+    finally:
+        mm.close()
+    return out[:n]
+
+
+def decode(idx):
+    """Inverse of encode: uppercase letters for an index array."""
+    return alphabet.decode(np.asarray(idx, dtype=np.uint8).tobytes())
+
+
+def histogram(idx):
+    """Letter counts of an index array, counted a chunk at a time."""
+    hist = np.zeros(26, dtype=np.int64)
+    for start in range(0, len(idx), CHUNK_SIZE):
+        hist += np.bincount(idx[start:start + CHUNK_SIZE], minlength=26)
+    return hist
+
+
+def columns(idx, period):
+    """Strided views idx[j::period] of every column; nothing is copied."""
+    return [idx[j::period] for j in range(period)]
+
+
+def column_histograms(idx, period):
+    """Letter counts of every column, as a (period, 26) array.
+
+    Short inputs take one bincount of (column, letter) pairs; longer ones
+    are counted column by column over strided views.
+    """
+    if len(idx) > CHUNK_SIZE:
+        return np.array([histogram(col) for col in columns(idx, period)])
+    cols = np.arange(len(idx)) % period
+    return np.bincount(cols * 26 + idx, minlength=period * 26).reshape(period, 26)
+
+
+def coincidence(hist):
+    """Index of coincidence of a letter histogram (last axis)."""
+    hist = np.asarray(hist, dtype=np.float64)
+    n = hist.sum(axis=-1)
+    return (hist * (hist - 1)).sum(axis=-1) / np.maximum(n * (n - 1), 1)
+
+
+def friedman(idx):
+    """Index of coincidence and Friedman key length estimate."""
+    return friedman_counts(histogram(idx))
+
+
+def friedman_counts(hist):
+    """friedman() of a text given by its letter histogram."""
+    n = float(np.sum(hist))
+    ic = coincidence(hist)
+    # key length => measure of roughness - deviation from a flat frequency
+    return ic, (0.027 * n) / (((n - 1) * ic) - (0.038 * n) + 0.065)
+
+
+_shifts = {}
+
+
+def shift_matrix(ref=ENGLISH):
+    """Circulant matrix C with C[j, g] = ref[(j - g) % 26], cached per
+    table (keyed by its bytes), so a profile's matrix is built once.
+
+    For a column's letter frequencies y, y.dot(C)[g] = sum_i ref[i] * y[i + g],
+    the M_g value of key letter g.
+    """
+    ref = np.asarray(ref, dtype=np.float64)
+    key = ref.tobytes()
+    if key not in _shifts:
+        j = np.arange(26)
+        _shifts[key] = ref[(j[:, None] - j[None, :]) % 26]
+    return _shifts[key]
+
+
+def mg_tables(hists, ref=ENGLISH):
+    """M_g table (Equation #6) of every column: one row of 26 per histogram."""
+    hists = np.atleast_2d(hists).astype(np.float64)
+    freq = hists / np.maximum(hists.sum(axis=1), 1)[:, None]
+    return freq.dot(shift_matrix(ref))
+
+
+def key_histograms(idx, key_length, variant=vigenere.VIGENERE):
+    """Column letter counts that a key letter of ``variant`` turns into
+    plaintext, as (hists, negate) pairs: deciphered by key letter g, column
+    j holds letter x as often as hists[j, x + g], or hists[j, x - g] with
+    negate, summed over the pairs.
+
+    Autokey columns are unrolled (vigenere.unroll) into a Vigenere part
+    (even rows) and a variant Beaufort part (odd rows); periodic variants
+    are read off the Vigenere column histograms (periodic_histograms).
+    """
+    if variant != vigenere.AUTOKEY:
+        return periodic_histograms(column_histograms(idx, key_length), variant)
+    unrolled = vigenere.unroll(np.asarray(idx, dtype=np.uint8).tobytes(), key_length).ravel()
+    cells = np.arange(len(idx))
+    cells = (((cells // key_length) % 2) * key_length + cells % key_length) * 26 + unrolled[:len(idx)]
+    hists = np.bincount(cells, minlength=2 * key_length * 26).reshape(2, key_length, 26)
+    return [(hists[0], False), (hists[1], True)]
+
+
+def periodic_histograms(hists, variant=vigenere.VIGENERE):
+    """key_histograms() of a periodic variant from the column histograms.
+
+    Variant Beaufort (P = C + K) is Vigenere with the key negated, and
+    Beaufort (P = K - C) is variant Beaufort on the negated text.
+    """
+    if variant == vigenere.VIGENERE:
+        return [(hists, False)]
+    if variant == vigenere.VARIANT:
+        return [(hists, True)]
+    if variant == vigenere.BEAUFORT:
+        return [(hists[:, NEGATE], True)]
+    raise ValueError("not a periodic variant: %s" % variant)
+
+
+def vigenere_view(idx, variant=vigenere.VIGENERE):
+    """Letters under which a periodic variant is Vigenere, and whether the
+    Vigenere key found for them is the variant's key negated; lets the
+    Vigenere-only tools (solver, crib) break the other variants."""
+    if variant not in vigenere.PERIODIC:
+        raise ValueError("not a periodic variant: %s" % variant)
+    return (NEGATE[idx] if variant == vigenere.BEAUFORT else idx), variant != vigenere.VIGENERE
+
+
+def key_tables(parts, ref=ENGLISH):
+    """M_g tables of every column indexed by key letter, and the number of
+    letters in each column, from key_histograms() parts."""
+    if len(parts) == 1:
+        hists, negate = parts[0]
+        mg = mg_tables(hists, ref)
+        return (mg[:, NEGATE] if negate else mg), hists.sum(axis=1)
+    tables = weights = 0
+    for hists, negate in parts:
+        mg = mg_tables(hists, ref)
+        counts = hists.sum(axis=1)
+        tables = tables + (mg[:, NEGATE] if negate else mg) * counts[:, None]
+        weights = weights + counts
+    return tables / np.maximum(weights, 1)[:, None], weights
+
+
+def crack(idx, key_length, ref=ENGLISH, desirable=.065, variant=vigenere.VIGENERE):
+    """Key letters whose M_g value is nearest to ``desirable``.
+
+    Returns the key indices and the M_g tables they were picked from.
+    """
+    return _nearest(key_tables(key_histograms(idx, key_length, variant), ref)[0], desirable)
+
+
+def crack_columns(hists, ref=ENGLISH, desirable=.065, variant=vigenere.VIGENERE):
+    """crack() of a text given by its column histograms."""
+    return _nearest(key_tables(periodic_histograms(hists, variant), ref)[0], desirable)
+
+
+def _nearest(tables, desirable):
+    instrument.count('keys_evaluated', tables.size)
+    return np.abs(tables - desirable).argmin(axis=1), tables
+
+
+def fit(idx, key, ref=ENGLISH, variant=vigenere.VIGENERE):
+    """How well the decryption by key matches ref: the mean over its
+    letters of ref[letter], about .065 for English plaintext and less for
+    a wrong key."""
+    return _fit(key_tables(key_histograms(idx, len(key), variant), ref), key)
+
+
+def fit_columns(hists, key, ref=ENGLISH, variant=vigenere.VIGENERE):
+    """fit() of a text given by its column histograms at len(key)."""
+    return _fit(key_tables(periodic_histograms(hists, variant), ref), key)
+
+
+def _fit(tables, key):
+    tables, weights = tables
+    return float(tables[np.arange(len(key)), key].dot(weights) / max(weights.sum(), 1))
@@ -0,0 +1,126 @@
+"""Batch Vigenere breaker: crack many ciphertexts in one run.
+
+Messages come from a directory (one file per message), a JSONL file or
+stdin (JSON objects with "id" and "ciphertext", or one raw ciphertext per
+line). Reference tables are built once at import and each worker loads
+the language profile once, when it starts; one JSON result per message
+is written in input order. Each worker caches results by ciphertext in
+memory (see cache.py), so a message is cracked once per worker that
+receives it. With --cache the workers share results through an SQLite
+file, which also keeps them across runs, and a repeat is cracked again
+only while the first copy is still being cracked elsewhere. With
+--variant, messages are taken as Beaufort, variant Beaufort or autokey.
+"""
+
+import sys, os, json, time, argparse
+from multiprocessing import Pool
+import analysis, cache, keylength, language, vigenere
+
+TOP = 5     # key length candidates reported per message
+
+_profile = None     # set in each worker by _setup
+_variant = vigenere.VIGENERE
+
+
+def _setup(lang, variant, path):
+    """Pool initializer: the language profile, variant and result cache of
+    this run, so workers need not inherit them through fork."""
+    global _profile, _variant
+    _profile = language.load(lang) if lang else None
+    _variant = variant
+    if path:
+        cache.default = cache.Cache(path=path)
+
+
+def messages(source):
+    """Yield (id, ciphertext) pairs from a directory, JSONL file or stdin."""
+    if source != '-' and os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            with open(os.path.join(source, name), 'rb') as f:
+                yield name, f.read()
+        return
+    if source == '-':
+        for item in _lines(sys.stdin):
+            yield item
+        return
+    with open(source) as f:
+        for item in _lines(f):
+            yield item
+
+
+def _lines(f):
+    for n, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            obj = json.loads(line)
+            yield obj.get('id', n), str(obj['ciphertext'])
+        else:
+            yield n, line
+
+
+def analyse(idx, variant=vigenere.VIGENERE):
+    """Key length candidates with their confidences, the key cracked from
+    the shortlisted lengths and how well its decryption fits the language.
+    Autokey has no key length candidates; every primer length is tried."""
+    if _profile is None:
+        ref, coincidence = analysis.ENGLISH, .065
+    else:
+        ref, coincidence = _profile.freq, _profile.coincidence
+    if variant == vigenere.AUTOKEY:
+        candidates = []
+        key, fit = keylength.autokey_key(idx, ref, coincidence)
+    else:
+        candidates = keylength.candidates(idx, coincidence=coincidence)
+        key, fit = keylength.best_key(idx, keylength.shortlist(candidates),
+                                      lambda n: analysis.crack(idx, n, ref, coincidence, variant)[0],
+                                      ref, variant=variant)
+    if key is None:
+        return {'key_lengths': [], 'error': 'no key length candidates'}
+    return {'key_lengths': candidates[:TOP], 'key': analysis.decode(key), 'score': fit}
+
+
+def crack_one(item, variant=None):
+    """Crack one message (as _variant unless given); returns its result
+    record."""
+    ident, cipher = item
+    variant = variant or _variant
+    start = time.time()
+    idx = analysis.encode(cipher)
+    result = {'id': ident, 'letters': len(idx)}
+    if len(idx) < 2:
+        result['error'] = 'too short'
+    else:
+        result.update(cache.default.memo('batch', idx, [_profile and _profile.name, variant],
+                                         lambda: analyse(idx, variant)))
+    result['seconds'] = time.time() - start
+    return result
+
+
+def main(argv):
+    description = "Batch Vigenere Breaker"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('source', help='directory, JSONL file or - for stdin')
+    parser.add_argument('-o', metavar='out-file', type=argparse.FileType('w'), default=sys.stdout, help='JSONL results (default: stdout)')
+    parser.add_argument('--workers', metavar='N', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('-l', metavar='lang', help='language profile to score against (e.g. english)')
+    parser.add_argument('--cache', metavar='db', help='keep results in this SQLite file across runs')
+    parser.add_argument('--variant', choices=vigenere.VARIANTS, default=vigenere.VIGENERE, help='cipher variant (default: vigenere)')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    pool = Pool(args.workers, initializer=_setup, initargs=(args.l, args.variant, args.cache))
+    count = 0
+    try:
+        for result in pool.imap(crack_one, messages(args.source), chunksize=64):
+            args.o.write(json.dumps(result) + '\n')
+            count += 1
+    finally:
+        pool.terminate()
+    elapsed = time.time() - start
+    sys.stderr.write('%d messages in %.2fs (%.1f msg/s)\n'
+                     % (count, elapsed, count / elapsed if elapsed else 0.0))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,206 @@
+"""Benchmarks for encryption, decryption, key-length estimation and cracking.
+
+Synthetic ciphertexts are made from the letters of article.txt and
+plaintext.txt, repeated up to each size and enciphered with a random key
+of each length. Every stage runs in a child process so its peak memory
+can be measured on its own. Results are written as JSON; --compare checks
+them against an earlier run and fails when a stage got slower than the
+allowed threshold.
+
+--startup also times the command-line entry points started cold on a
+short ciphertext, interpreter start and imports included.
+
+    python bench.py --sizes 1K,1M,100M -o bench.json
+    python bench.py --compare bench.json --threshold 0.2
+    python bench.py --startup --stages none
+"""
+
+import sys, os, json, time, random, argparse, importlib, platform, resource, subprocess, tempfile
+from multiprocessing import Process, Queue
+from queue import Empty
+import vigenere, analysis, cache
+
+breaker = importlib.import_module('break')
+import example1, example2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPORA = ['article.txt', 'plaintext.txt']
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def size(text):
+    """Parse sizes such as 1K, 10M."""
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def corpus():
+    letters = ''
+    for name in CORPORA:
+        with open(os.path.join(HERE, name), 'rb') as f:
+            letters += analysis.decode(analysis.encode(f.read()))
+    return letters
+
+
+def case(letters, nbytes, key_length, rng):
+    """Plaintext of nbytes letters, a random key and the ciphertext."""
+    plain = (letters * (nbytes // len(letters) + 1))[:nbytes]
+    key = ''.join(rng.choice(analysis.LETTERS) for _ in range(key_length))
+    return plain, key, vigenere.vce(key, plain)
+
+
+def ex2_key(plain, key):
+    """example2 shifts by letter + 1, so its keys read one letter lower."""
+    return ''.join(chr((ord(k) - 66) % 26 + 97) for k in key)
+
+
+# name -> (run(plain, key, cipher), expected(plain, key)); expected None
+# means the stage has no accuracy measure
+STAGES = [
+    ('vigenere.vce', lambda p, k, c: vigenere.vce(k, p), lambda p, k: None),
+    ('vigenere.vcd', lambda p, k, c: vigenere.vcd(k, c), lambda p, k: p),
+    ('break.kasinski', lambda p, k, c: breaker.kasinski(c), lambda p, k: len(k)),
+    ('break.friedman', lambda p, k, c: breaker.friedman(c), lambda p, k: None),
+    ('break.crack', lambda p, k, c: breaker.crack(c, len(k)), lambda p, k: k),
+    ('example1.crack', lambda p, k, c: ''.join(example1.crack(c, len(k))), lambda p, k: k),
+    ('example1.decipher', lambda p, k, c: ''.join(example1.decipher(c, k)), lambda p, k: p.lower()),
+    ('example2.keyword_length', lambda p, k, c: example2.keyword_length(c), lambda p, k: len(k)),
+    ('example2.find_keyword', lambda p, k, c: example2.find_keyword(c, len(k)), ex2_key),
+]
+
+
+# name -> command line (run by this interpreter in this directory); {file}
+# is a short ciphertext and {key} its key
+STARTUP = [
+    ('vigenere.py encrypt', ['vigenere.py', '--oper', 'e', '-k', '{key}', '-i', '{file}']),
+    ('vigenere.py decrypt', ['vigenere.py', '--oper', 'd', '-k', '{key}', '-i', '{file}']),
+    ('break.py', ['break.py', '-i', '{file}']),
+    ('import example1', ['-c', 'import example1']),
+    ('import example2', ['-c', 'import example2']),
+]
+
+
+def startup(letters, nbytes, key_length, repeat, rng):
+    """Best wall time of every STARTUP command line."""
+    plain, key, cipher = case(letters, nbytes, key_length, rng)
+    results = []
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as f, open(os.devnull, 'w') as null:
+        f.write(cipher)
+        f.flush()
+        for name, argv in STARTUP:
+            argv = [sys.executable] + [a.format(file=f.name, key=key) for a in argv]
+            seconds = float('inf')
+            for _ in range(repeat):
+                start = time.time()
+                subprocess.check_call(argv, cwd=HERE, stdout=null)
+                seconds = min(seconds, time.time() - start)
+            sys.stderr.write('%-24s %10d %3d %9.4fs\n' % ('startup ' + name, nbytes, key_length, seconds))
+            results.append({'stage': 'startup ' + name, 'bytes': nbytes,
+                            'key_length': key_length, 'seconds': seconds})
+    return results
+
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def measure(name, plain, key, cipher, repeat, queue):
+    """Child process: best time of one stage and its peak memory growth.
+    The stage is passed by name, as its lambdas cannot be pickled."""
+    run, expected = dict((stage[0], stage[1:]) for stage in STAGES)[name]
+    sys.stdout = open(os.devnull, 'w')
+    # time the work, not the result cache
+    cache.default = cache.Cache(size=0)
+    try:
+        start_kb = rss_kb()
+        seconds = float('inf')
+        for _ in range(repeat):
+            start = time.time()
+            out = run(plain, key, cipher)
+            seconds = min(seconds, time.time() - start)
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_kb
+        want = expected(plain, key)
+        queue.put({'seconds': seconds, 'peak_mb': max(peak_kb, 0) / 1024.0,
+                   'correct': None if want is None else out == want})
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+
+def bench(sizes, key_lengths, stages, repeat=3, seed=0):
+    rng = random.Random(seed)
+    letters = corpus()
+    results = []
+    for nbytes in sizes:
+        for key_length in key_lengths:
+            plain, key, cipher = case(letters, nbytes, key_length, rng)
+            for name, _, _ in STAGES:
+                if stages and name not in stages:
+                    continue
+                queue = Queue()
+                child = Process(target=measure, args=(name, plain, key, cipher, repeat, queue))
+                child.start()
+                result = None
+                while result is None:
+                    try:
+                        result = queue.get(timeout=1)
+                    except Empty:
+                        if not child.is_alive():
+                            result = {'error': 'exit code %s' % child.exitcode}
+                child.join()
+                if 'error' in result:
+                    sys.stderr.write('%-24s %10d %3d failed: %s\n' % (name, nbytes, key_length, result['error']))
+                    continue
+                result.update(stage=name, bytes=nbytes, key_length=key_length,
+                              mb_per_s=nbytes / 1e6 / max(result['seconds'], 1e-9))
+                sys.stderr.write('%-24s %10d %3d %9.4fs %9.2f MB/s %8.1f MB %s\n' % (
+                    name, nbytes, key_length, result['seconds'], result['mb_per_s'],
+                    result['peak_mb'], result['correct']))
+                results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Stages slower than the baseline by more than threshold (a fraction)."""
+    old = dict(((r['stage'], r['bytes'], r['key_length']), r) for r in baseline)
+    slower = []
+    for r in results:
+        b = old.get((r['stage'], r['bytes'], r['key_length']))
+        if b and r['seconds'] > b['seconds'] * (1 + threshold):
+            slower.append((r['stage'], r['bytes'], r['key_length'], b['seconds'], r['seconds']))
+    return slower
+
+
+def main(argv):
+    description = "Vigenere benchmarks"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--sizes', default='1K,10K,100K,1M', help='comma separated input sizes (e.g. 1K,1M,100M)')
+    parser.add_argument('--key-lengths', default='3,7,13', help='comma separated key lengths')
+    parser.add_argument('--stages', help='comma separated stages to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the best time is kept')
+    parser.add_argument('--startup', action='store_true', help='also time cold starts of the command-line entry points')
+    parser.add_argument('-o', metavar='out-file', type=argparse.FileType('w'), default=sys.stdout, help='JSON results (default: stdout)')
+    parser.add_argument('--compare', metavar='baseline', type=argparse.FileType('r'), help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    results = bench([size(s) for s in args.sizes.split(',')],
+                    [int(n) for n in args.key_lengths.split(',')],
+                    args.stages.split(',') if args.stages else None, args.repeat)
+    if args.startup:
+        results += startup(corpus(), 2000, 5, max(args.repeat, 5), random.Random(0))
+    json.dump({'python': platform.python_version(), 'results': results}, args.o, indent=1)
+    args.o.write('\n')
+
+    if args.compare:
+        slower = compare(results, json.load(args.compare)['results'], args.threshold)
+        for stage, nbytes, key_length, before, after in slower:
+            sys.stderr.write('SLOWER %s %d bytes key %d: %.4fs -> %.4fs\n'
+                             % (stage, nbytes, key_length, before, after))
+        if slower:
+            sys.exit(1)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
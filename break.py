@@ -1,197 +1,203 @@
 import sys, argparse
-import operator
+import numpy as np
+import analysis, cache, instrument, keylength, repeats, vigenere
 
-def calculate_factors(num):
-    _factors = []
-    for i in range(4, num):
-        if num % i == 0:
-            _factors.append(i)
-    return _factors
+def letters(cipher):
+    """Letter indices of cipher, which may already be encoded."""
+    return cipher if isinstance(cipher, np.ndarray) else analysis.encode(cipher)
 
-def minus1(v):
-    return v-1
 
-def friedman(cipher):
+def friedman(cipher, verbose=False):
 
-    letters = map(chr, range(65, 91))
-    # Count letters.
-    freq = dict((key, cipher.count(key)) for key in letters)
-    print "freq: ", freq
-    v1 = freq.values()
-    n = sum(v1)
-
-    v2 = map(minus1,v1)
-    v3 = [a*b for a,b in zip(v1,v2)]
-    nn = sum(v3)
+    idx = letters(cipher)
+    if verbose:
+        print("freq: ", dict(zip(analysis.LETTERS, analysis.histogram(idx).tolist())))
 
     # index of coincidence => Equation #5 in article
-    ic = nn / (float)(n * (n-1))
-    
     # key length => measure of roughness - deviation from a flat frequency
-    l = (0.027 * n) / (((n - 1) * ic) - (0.038 * n) + 0.065)
-
-    return (ic,l)
+    return analysis.friedman(idx)
 
 
-def kasinski(cipher, sz=3):
+def kasinski(cipher, sz=3, max_sz=5):
     #
-    # step 1 - find trigram's repetition distances
+    # distances between repeated n-grams of sz..max_sz letters, ranked by
+    # the key lengths that divide them
     #
-    trigrams = {}
-
-    for i in xrange(0,len(cipher)):
-        trigram = cipher[i:i+sz]
-        if not trigrams.has_key(trigram):
-            distances = []
-            pos = cipher.find(trigram, i+sz)
-            while pos > -1:
-                diff = pos - i
-                distances.append(diff)
-                pos = cipher.find(trigram, pos+sz)
-            if len(distances):
-                trigrams[trigram] = distances
-
-    def lencmp(x,y):
-        return len(x) - len(y)
-
-    sorted_x = sorted(trigrams.items(), key=operator.itemgetter(1), cmp=lencmp, reverse=True)
-    maxl = len(sorted_x)
-    maxl = maxl if maxl < 5 else 5
-    #print "==> Trigrams"
-    #for i in range(maxl):
-    #    print sorted_x[i]
+    idx = letters(cipher)
+    candidates = cache.default.memo('key_lengths', idx, [sz, max_sz],
+                                    lambda: repeats.key_lengths(idx, sz, max(sz, max_sz)))
+    #print("==> most likely key lengths:")
+    #print("(length, score)")
+    #for c in candidates[:5]:
+    #    print(c)
 
-    #
-    # step 2 - find common factors for all distances
-    #
-    alldistances = {}
-    for (tr,ds) in trigrams.items():
-        for d in ds:
-            if alldistances.has_key(d):
-                alldistances[d] = alldistances[d] + 1
-            else:
-                alldistances[d] = 0
-
-    sorted_x = sorted(alldistances.items(), key=operator.itemgetter(1), reverse=True)
-    #print "==> (distance, ocurrences)"
-    maxl = len(sorted_x)
-    maxl = maxl if maxl < 5 else 5
-    #for i in range(maxl):
-    #    print sorted_x[i]
-
-    # get factors
-    #print "==> Factors"
-    factors = {}
-    maxl = len(sorted_x)
-    maxl = maxl if maxl < 5 else 5
-    for i in range(maxl):
-        f = calculate_factors(sorted_x[i][0])
-        #print f
-        # count factor occurences
-        for n in f:
-            if factors.has_key(n):
-                factors[n] = factors[n]+1
-            else:
-                factors[n] = 0
-
-    sorted_x = sorted(factors.items(), key=operator.itemgetter(1), reverse=True)
-    maxl = len(sorted_x)
-    maxl = maxl if maxl < 5 else 5
-    #print "==> most likely key lengths:"
-    #print "(length, count)"
-    #for i in range(maxl):
-    #    print sorted_x[i]
-
-    return sorted_x[0][0]
-
-def crack(cipher, key_length):
-    #
-    # create groups by key length
-    #
-    key = ""
-    groups = []
-    for i in range(key_length):groups.append('')
-    for i in range(len(cipher)): groups[i % key_length] += cipher[i]
-    #print "==> key_length: ", key_length
-    #print y
-    #for i in groups: print i
+    return candidates[0][0]
 
+def crack(cipher, key_length, profile=None, verbose=False, variant=vigenere.VIGENERE):
     #
-    # calculate frequency
+    # M_g table of every group by key length => Equation #6
     #
-    letters = map(chr, range(65, 91))
-    for g in groups:
-
-        # Count letters.
-        freq = dict((key, g.count(key)) for key in letters)
-        #print "letter freq: ", freq
-
-        # Compute letter frequency/probability in each group g (y_i)
-        disp = dict((key, float(freq[key]) / len(g)) for key in freq)
-        #print "dispersion: ", disp
-        
-        # Average letter occurence chances in English text. (ideal, p_i))
-        english_avg = {
-            'A': .082, 'B': .015, 'C': .028, 'D': .043,
-            'E': .127, 'F': .022, 'G': .020, 'H': .061,
-            'I': .070, 'J': .002, 'K': .008, 'L': .040,
-            'M': .024, 'N': .067, 'O': .075, 'P': .019,
-            'Q': .001, 'R': .060, 'S': .063, 'T': .091,
-            'U': .028, 'V': .010, 'W': .023, 'X': .001,
-            'Y': .020, 'Z': .001
-        }
-
-        #
-        # compute table M_g => Equation #6
-        # 
-        ics = []
-        for i in xrange(26):
-            r = 0
-            l = chr(i + 65)
-            for j in xrange(26):
-                f = english_avg[chr(j + 65)]
-                d = disp[chr(((i + j) % 26) + 65)]
-                r += f * d
-                #print "j:",j," i:",i, " f:", f, " d:", d 
-            #print "??? -> '%c' = %.3f" % (l, r)
-            ics.append((l, r))
-            print " %.3f" % r
-        print "M_g: ", ics
-
-        #
-        # find suiting value.
-        # 
-        desirable = .065
-        nearest_value = 999
-        nearest_index = 0
-        for i, ic in enumerate(ics):
-            difference = abs(desirable - ic[1])
-            if difference < nearest_value:
-                nearest_value = difference
-                nearest_index = i
-        print " -> nearest: %d '%c' by %.3f" % (nearest_index, ics[nearest_index][0],ics[nearest_index][1])
-        key += ics[nearest_index][0]
-
-    return key
+    idx = letters(cipher)
+    def score():
+        if profile is None:
+            return analysis.crack(idx, key_length, variant=variant)
+        return analysis.crack(idx, key_length, profile.freq, profile.coincidence, variant)
+    if not verbose:
+        return cache.default.memo('crack', idx, [key_length, profile and profile.name, variant],
+                                  lambda: analysis.decode(score()[0]))
+    key, tables = score()
+    for k, mg in zip(key, tables):
+        for r in mg:
+            print(" %.3f" % r)
+        print("M_g: ", list(zip(analysis.LETTERS, mg.tolist())))
+        print(" -> nearest: %d '%c' by %.3f" % (k, analysis.LETTERS[k], mg[k]))
+
+    return analysis.decode(key)
+
+def stream(args):
+    """Key estimates of ciphertext read as it arrives, in constant memory."""
+    def settled(result):
+        print("after %d letters: key length candidates: %s; Key: %s" % (
+            result['letters'], ", ".join("%d (%.2f)" % c for c in result['key_lengths']), result['key']))
+        sys.stdout.flush()
+
+    import language, online
+    profile = language.load(args.l) if args.l else None
+    analyser = online.Analyser(min_size=args.s, max_size=args.S, profile=profile, on_stable=settled,
+                               variant=args.variant)
+    fin = sys.stdin.buffer if args.i == '-' else open(args.i, 'rb')
+    with instrument.stage('stream'):
+        # read1 hands over whatever has arrived instead of waiting for a full chunk
+        for chunk in iter(lambda: fin.read1(online.CHUNK_SIZE), b''):
+            analyser.feed(chunk)
+    result = analyser.result(args.top)
+    if 'error' in result:
+        sys.exit(result['error'])
+    print("key length candidates: ", ", ".join("%d (%.2f)" % c for c in result['key_lengths']))
+    print("key length: ", len(result['key']))
+    print("Key: ", result['key'])
+    if args.profile:
+        instrument.emit(args.profile)
 
 def main(argv):
     description = "Vigenere Breaker"
     parser = argparse.ArgumentParser(description=description)
-    parser.add_argument('-i', metavar='in-file', type=argparse.FileType('rt'), help='the file to process', required=True)
+    parser.add_argument('-i', metavar='in-file', help='the file to process (- for stdin)', required=True)
     parser.add_argument('-s', metavar='gram_sz', type=int, help='the gram size', default=3)
+    parser.add_argument('-S', metavar='max_gram_sz', type=int, help='the largest gram size', default=5)
+    parser.add_argument('-l', metavar='lang', help='language profile to score against (e.g. english)')
+    parser.add_argument('-w', metavar='wordlist', help='try the keys of this wordlist (one per line) instead of cracking columns')
+    parser.add_argument('--crib', metavar='word', help='a word known to be in the plaintext; the key is read off where it fits')
+    parser.add_argument('--top', metavar='k', type=int, default=keylength.TOP, help='crack at most this many of the likeliest key lengths')
+    parser.add_argument('--climb', metavar='restarts', type=int, default=0, help='refine the key by quadgram hill-climbing with this many restarts')
+    parser.add_argument('-d', dest='decrypt', action='store_true', help='print the deciphered text')
+    parser.add_argument('-v', dest='verbose', action='store_true', help='print letter counts and the M_g table of every column')
+    parser.add_argument('--variant', choices=vigenere.VARIANTS, default=vigenere.VIGENERE, help='cipher variant (default: vigenere)')
+    parser.add_argument('--stream', action='store_true', help='analyse the input as it arrives, printing the key whenever it settles')
+    parser.add_argument('--cache', metavar='db', help='keep key lengths and keys in this SQLite file across runs')
+    parser.add_argument('--profile', choices=instrument.FORMATS, help='report stage timings and counters to stderr')
     args = parser.parse_args()
-
-    # get all ciphertext
-    cipher = ''.join(args.i.readlines()).rstrip().upper()
-
-    #(ic,kl) = friedman(cipher)
-    #print "==> friedman test: ", ic, " kl: ", kl
-
-    key_length = kasinski(cipher, args.s)
-    print "kasinski key length: ", key_length
-
-    keyw = crack(cipher, key_length)
-    print "Key: ", keyw
+    if args.stream and (args.decrypt or args.climb or args.w or args.crib or args.verbose):
+        parser.error('--stream keeps no ciphertext: it cannot be combined with -d, -v, -w, --crib or --climb')
+    if args.variant == vigenere.AUTOKEY and (args.stream or args.crib or args.climb):
+        parser.error('autokey has no key period: --stream, --crib and --climb cannot be used')
+    if args.profile:
+        instrument.enable()
+    if args.cache:
+        cache.default = cache.Cache(path=args.cache)
+
+    if args.stream:
+        stream(args)
+        return
+
+    # get all ciphertext, memory-mapped and normalized in one pass
+    if args.i == '-':
+        with instrument.stage('load'):
+            raw = sys.stdin.buffer.read()
+        with instrument.stage('normalize'):
+            idx = analysis.encode(raw)
+        del raw
+    else:
+        idx = analysis.load(args.i)
+    instrument.count('letters_processed', len(idx))
+
+    if args.verbose:
+        (ic,kl) = friedman(idx, args.verbose)
+        print("==> friedman test: ", ic, " kl: ", kl)
+
+    profile = None
+    if args.l:
+        import language
+        profile = language.load(args.l)
+    ref, coincidence = (profile.freq, profile.coincidence) if profile else (analysis.ENGLISH, .065)
+
+    if args.crib:
+        # a known word replaces the key length search and column cracking
+        import crib
+        with instrument.stage('crib'):
+            hits = crib.search(idx, args.crib, ref=ref, first=True, variant=args.variant)
+        if not hits:
+            sys.exit("the crib fits nowhere with a key shorter than itself")
+        keyw = hits[0][2]
+        key_length = len(keyw)
+        print("crib hits: ", ", ".join("%s at %d (%.3f)" % (k, o, f) for o, l, k, f in hits[:5]))
+    elif args.w:
+        # a wordlist replaces the key length search and column cracking
+        import dictionary
+        with instrument.stage('dictionary'):
+            with open(args.w, 'rb') as f:
+                keys = dictionary.attack(idx, f.read(), profile, variant=args.variant)
+        if not keys:
+            sys.exit("no keys in the wordlist")
+        keyw = keys[0][0]
+        key_length = len(keyw)
+        print("dictionary candidates: ", ", ".join("%s (%.1f)" % k for k in keys[:5]))
+    elif args.variant == vigenere.AUTOKEY:
+        # no period to estimate: every primer length is cracked
+        with instrument.stage('column_scoring'):
+            key, fit = keylength.autokey_key(idx, ref, coincidence)
+        if key is None:
+            sys.exit("too little ciphertext to estimate a key length")
+        key_length = len(key)
+        keyw = analysis.decode(key)
+        print("key length: ", key_length)
+    else:
+        # Kasiski, Friedman and column IC merged into ranked key lengths;
+        # only the shortlist is cracked
+        with instrument.stage('key_length'):
+            ranked = cache.default.memo('key_length_candidates', idx, [args.s, args.S, coincidence],
+                                        lambda: keylength.candidates(idx, coincidence=coincidence,
+                                                                     min_size=args.s, max_size=args.S))
+            lengths = keylength.shortlist(ranked, args.top)
+        if not lengths:
+            sys.exit("too little ciphertext to estimate a key length")
+        print("key length candidates: ", ", ".join("%d (%.2f)" % (l, c) for l, c in ranked[:5]))
+
+        with instrument.stage('column_scoring'):
+            key, fit = keylength.best_key(idx, lengths, lambda n: analysis.encode(crack(idx, n, profile, args.verbose, args.variant)),
+                                          ref, variant=args.variant)
+        key_length = len(key)
+        keyw = analysis.decode(key)
+        print("key length: ", key_length)
+    if args.climb:
+        import language, solver
+        profile = language.load(args.l or 'english')
+        # the solver scores Vigenere keys; the other periodic variants are
+        # climbed as Vigenere on their Vigenere view
+        view, negate = analysis.vigenere_view(idx, args.variant)
+        with instrument.stage('hill_climb'):
+            key, fitness = solver.solve(view, key_length, profile, args.climb)
+        keyw = analysis.decode(analysis.NEGATE[key] if negate else key)
+        print("hill-climb fitness: ", fitness)
+    print("Key: ", keyw)
+
+    if args.decrypt:
+        with instrument.stage('decrypt'):
+            plain = vigenere.vcd(keyw, analysis.decode(idx), args.variant)
+        print(plain)
+
+    if args.profile:
+        instrument.emit(args.profile)
 
 if __name__ == "__main__":
    main(sys.argv[1:])
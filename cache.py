@@ -0,0 +1,107 @@
+"""Result cache for repeated cracking work.
+
+Results are keyed by a digest of the ciphertext letters together with
+the name of the computation and its parameters, so a ciphertext sent
+again, whatever its spacing or case, skips the key-length search and
+column scoring. The in-memory store is a bounded LRU; with a path, every
+result is also written to SQLite and survives restarts (and is shared by
+processes using the same file). Values must be JSON-serializable: they
+are stored as JSON text in memory as on disk, and every hit returns a
+fresh decoded copy (tuples come back as lists), whichever store it came
+from. memo() returns the same form on a miss.
+
+Hit and miss counts are kept on the cache (see stats()) and, when
+recording is on, in instrument counters.
+"""
+
+import os, json, hashlib, threading
+from collections import OrderedDict
+import instrument
+
+SIZE = 4096     # entries kept in memory
+
+
+def digest(letters):
+    """Hex digest of letter indices (a string or a contiguous array)."""
+    return hashlib.sha1(letters).hexdigest()
+
+
+class Cache(object):
+    """Bounded LRU mapping, optionally backed by an SQLite file."""
+
+    def __init__(self, size=SIZE, path=None):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        self.lock = threading.Lock()
+        self.path = path
+        self._db = self._pid = None
+
+    @property
+    def db(self):
+        """SQLite connection of this process (connections do not survive
+        a fork, so pool workers open their own), or None."""
+        if self.path and self._pid != os.getpid():
+            import sqlite3
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)')
+            self._db.commit()
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, key):
+        """Cached value for key (a decoded copy), or None."""
+        with self.lock:
+            text = self.entries.pop(key, None)
+            if text is None and self.path:
+                row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    text = row[0]
+                    self.disk_hits += 1
+            if text is None:
+                self.misses += 1
+                instrument.count('cache_misses')
+                return None
+            self.hits += 1
+            instrument.count('cache_hits')
+            self._insert(key, text)
+        return json.loads(text)
+
+    def put(self, key, value):
+        """Store value; returns the copy of it that get() will return."""
+        text = json.dumps(value)
+        with self.lock:
+            self.entries.pop(key, None)
+            self._insert(key, text)
+            if self.path:
+                self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?)', (key, text))
+                self.db.commit()
+        return json.loads(text)
+
+    def _insert(self, key, text):
+        self.entries[key] = text
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def key(self, name, letters, params):
+        return '%s:%s:%s' % (name, digest(letters), json.dumps(params, sort_keys=True))
+
+    def memo(self, name, letters, params, compute):
+        """compute() for these letters and parameters, cached."""
+        key = self.key(name, letters, params)
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'size': self.size,
+                'hits': self.hits, 'misses': self.misses,
+                'disk_hits': self.disk_hits, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+# used by break, batch, example2 and server unless they are given another
+default = Cache()
@@ -0,0 +1,116 @@
+"""Crib dragging: recover the key from a word known to be in the plaintext.
+
+Subtracting a crib from the ciphertext under it gives the key letters at
+that offset. Where the crib really sits and is longer than the key, the
+fragment repeats with the key's period; elsewhere it is noise. Every
+offset is tried at once: the ciphertext is viewed as a sliding window
+of the crib's length, one vectorized subtraction gives all fragments,
+and each candidate period is checked for all offsets column by column.
+
+A period has to be confirmed by enough repeated letters that a random
+fragment is unlikely to pass (see checks()); hits are then ranked by how
+well their key decrypts the text (analysis.fit). Beaufort and variant
+Beaufort are searched as Vigenere on their Vigenere view
+(analysis.vigenere_view); autokey has no period to find.
+
+    python crib.py -i ciphertext.txt -c "known words"
+"""
+
+import sys, math, time, argparse
+import numpy as np
+import alphabet, analysis, instrument, vigenere
+
+CHUNK = 1 << 20     # offsets checked per block
+FALSE_HITS = .01    # expected random hits allowed over the whole text
+SAMPLE = 1 << 16    # letters decrypted to rank a key
+
+
+def checks(offsets):
+    """Repeated letters needed before a period is believed: random
+    fragments pass one with probability 26 ** -checks."""
+    return max(3, int(math.ceil(math.log(max(offsets, 1) / FALSE_HITS, 26))))
+
+
+def fragments(idx, crib):
+    """Key letters implied by the crib at every offset, as an (offsets,
+    len(crib)) uint8 array."""
+    windows = np.lib.stride_tricks.sliding_window_view(idx, len(crib))
+    return (windows + np.uint8(26) - crib) % np.uint8(26)
+
+
+def periods(frags, max_length):
+    """Smallest period (up to max_length) of every fragment; 0 for none.
+
+    Each period is checked one letter pair at a time over the offsets that
+    are still consistent with it; about 1 in 26 survives every pair, so
+    only the first comparison touches all offsets.
+    """
+    columns = np.ascontiguousarray(frags.T)
+    period = np.zeros(len(frags), dtype=np.int64)
+    for length in range(1, max_length + 1):
+        alive = None
+        for j in range(frags.shape[1] - length):
+            a, b = columns[j], columns[j + length]
+            alive = np.flatnonzero(a == b) if alive is None else alive[a[alive] == b[alive]]
+            if not len(alive):
+                break
+        if alive is not None and len(alive):
+            alive = alive[period[alive] == 0]
+            period[alive] = length
+    return period
+
+
+def search(idx, crib, max_length=None, ref=analysis.ENGLISH, first=False, variant=vigenere.VIGENERE):
+    """Hits of the crib as (offset, key length, key, fit), best fit first.
+
+    Key lengths go up to len(crib) - checks(); a longer key cannot be
+    confirmed by this crib. Keys are given from the first letter of the
+    text, whatever the offset they were found at. With first, the search
+    stops after the first block of offsets holding a hit.
+    """
+    idx, negate = analysis.vigenere_view(np.asarray(idx, dtype=np.uint8), variant)
+    crib = np.frombuffer(alphabet.encode(crib), dtype=np.uint8)
+    offsets = len(idx) - len(crib) + 1
+    longest = len(crib) - checks(offsets)
+    if max_length:
+        longest = min(longest, max_length)
+    if offsets <= 0 or longest < 1:
+        return []
+    hits, fits = [], {}
+    for start in range(0, offsets, CHUNK):
+        frags = fragments(idx[start:start + CHUNK + len(crib) - 1], crib)
+        period = periods(frags, longest)
+        for n in np.flatnonzero(period):
+            offset, length = start + int(n), int(period[n])
+            key = np.roll(frags[n, :length], offset % length)
+            name = analysis.decode(analysis.NEGATE[key] if negate else key)
+            if name not in fits:
+                fits[name] = analysis.fit(idx[:SAMPLE], key, ref)
+            hits.append((offset, length, name, fits[name]))
+        if first and hits:
+            break
+    instrument.count('offsets_checked', min(offsets, start + CHUNK))
+    hits.sort(key=lambda h: (-h[3], h[0]))
+    return hits
+
+
+def main(argv):
+    description = "Vigenere crib search"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-i', metavar='in-file', help='the ciphertext (- for stdin)', required=True)
+    parser.add_argument('-c', metavar='crib', help='a word or phrase known to be in the plaintext', required=True)
+    parser.add_argument('-m', metavar='max-length', type=int, help='longest key to look for')
+    parser.add_argument('-n', metavar='count', type=int, default=10, help='hits to print')
+    parser.add_argument('--variant', choices=vigenere.PERIODIC, default=vigenere.VIGENERE, help='cipher variant (default: vigenere)')
+    args = parser.parse_args(argv)
+
+    idx = analysis.encode(sys.stdin.buffer.read()) if args.i == '-' else analysis.load(args.i)
+    start = time.time()
+    hits = search(idx, args.c, args.m, variant=args.variant)
+    elapsed = time.time() - start
+    for offset, length, key, fit in hits[:args.n]:
+        print("%10d %3d %-20s %.4f" % (offset, length, key, fit))
+    sys.stderr.write('%d hits in %.2fs\n' % (len(hits), elapsed))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
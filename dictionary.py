@@ -0,0 +1,180 @@
+"""Dictionary attack: try every word (or phrase) of a wordlist as the key.
+
+Statistical cracking needs a few hundred letters per key letter; when the
+key is a real word a wordlist finds it from far less. Keys are scored in
+two stages:
+
+1. Unigram fitness, for every key. Decrypting column j by key letter v
+   gives a fixed log-likelihood S[j, v] (the column's letter counts
+   against the shifted log-frequency table, as in analysis.mg_tables),
+   so a key scores sum_j S[j, key[j]] over the whole ciphertext without
+   decrypting anything. Keys of one length form a matrix in sorted (trie)
+   order and are scored a column at a time. A key, and with it every key
+   sharing its prefix, is dropped as soon as its partial score plus the
+   best possible remainder falls below a score already known to be beaten
+   by ``keep`` keys.
+2. Quadgram fitness, for the ``keep`` best keys only, on a decrypted
+   prefix of PREFIX letters.
+
+Other cipher variants are scored the same way from their own column
+counts (analysis.key_histograms).
+
+Wordlists are normalized in one translate call and split into per-length
+key matrices without a Python loop per word. Chunks of the wordlist are
+scored in a process pool.
+
+    python dictionary.py -i ciphertext.txt -w words.txt
+"""
+
+import sys, time, argparse
+import numpy as np
+import alphabet, analysis, instrument, language, vigenere
+
+KEEP = 256          # keys passed from the unigram to the quadgram stage
+PREFIX = 400        # letters decrypted per key for quadgram scoring
+CHUNK = 1 << 20     # keys scored per pool task
+MAX_KEY = 64        # longer lines are ignored
+
+# letters to 0..25, newline to 26, everything else deleted
+_WORDS = bytearray(alphabet.CODES)
+_WORDS[ord('\n')] = 26
+_WORDS = bytes(_WORDS)
+_DELETE = alphabet.NONLETTERS.replace(b'\n', b'')
+
+
+def keys(data, max_key=MAX_KEY):
+    """Key matrices of a wordlist (bytes, one key per line; case, spaces
+    and punctuation ignored) as {length: (n, length) uint8 array}, each
+    sorted and without duplicates."""
+    codes = np.frombuffer(data.translate(_WORDS, _DELETE) + b'\x1a', dtype=np.uint8)
+    ends = np.flatnonzero(codes == 26)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lengths = ends - starts
+    out = {}
+    for length in np.unique(lengths):
+        if not 0 < length <= max_key:
+            continue
+        rows = starts[lengths == length]
+        matrix = codes[rows[:, None] + np.arange(length)]
+        if length <= 13:
+            # base-26 codes sort like the keys and fit an int64
+            packed = np.zeros(len(matrix), dtype=np.int64)
+            for j in range(length):
+                packed = packed * 26 + matrix[:, j]
+            out[int(length)] = matrix[np.unique(packed, return_index=True)[1]]
+        else:
+            rows = np.unique(matrix.view(np.dtype((np.void, int(length)))).ravel())
+            out[int(length)] = rows.view(np.uint8).reshape(-1, length)
+    return out
+
+
+def column_scores(idx, length, logf, variant=vigenere.VIGENERE):
+    """S[j, v]: log-likelihood of column j decrypted by key letter v."""
+    scores = 0
+    for hists, negate in analysis.key_histograms(idx, length, variant):
+        part = hists.dot(analysis.shift_matrix(logf))
+        scores = scores + (part[:, analysis.NEGATE] if negate else part)
+    return scores
+
+
+def prune(matrix, scores, keep=KEEP):
+    """Indices and unigram scores of the best ``keep`` rows of a key matrix
+    under column scores S, best first."""
+    n, length = matrix.shape
+    # every key in a sample is scored in full; the keep-th best of them is
+    # beaten by at least keep keys, so nothing scoring below it can place
+    sample = matrix[::max(1, n // (64 * keep))]
+    full = scores[np.arange(length), sample].sum(axis=1)
+    floor = np.sort(full)[-keep] if len(full) >= keep else -np.inf
+    best = scores.max(axis=1)
+    rest = best.sum() - np.cumsum(best)
+    columns = np.ascontiguousarray(matrix.T)
+    alive = None
+    partial = np.zeros(n)
+    for j in range(length):
+        partial += scores[j].take(columns[j] if alive is None else columns[j, alive])
+        hopeful = partial + rest[j] >= floor
+        # dropping keys costs a copy; it pays once half of them can go
+        if np.count_nonzero(hopeful) <= len(partial) // 2:
+            alive = np.flatnonzero(hopeful) if alive is None else alive[hopeful]
+            partial = partial[hopeful]
+    if alive is None:
+        alive = np.arange(n)
+    instrument.count('keys_evaluated', n)
+    top = np.argsort(-partial, kind='mergesort')[:keep]
+    return alive[top], partial[top]
+
+
+_idx = _logf = _keys = _variant = None     # set by _setup in every worker
+
+
+def _setup(idx, logf, keys, variant):
+    """Pool initializer (also run in-process for one worker)."""
+    global _idx, _logf, _keys, _variant
+    _idx, _logf, _keys, _variant = idx, logf, keys, variant
+
+
+def _prune_chunk(task):
+    length, start, keep = task
+    matrix = _keys[length][start:start + CHUNK]
+    rows, fit = prune(matrix, column_scores(_idx, length, _logf, _variant), keep)
+    return matrix[rows], fit
+
+
+def attack(idx, data, profile=None, keep=KEEP, workers=1, variant=vigenere.VIGENERE):
+    """Keys of a wordlist (bytes) ranked against ciphertext letter indices,
+    as (key, quadgram score) pairs, best first."""
+    profile = profile or language.load('english')
+    idx = np.asarray(idx)
+    matrices = keys(data)
+    state = (idx, np.asarray(profile.tables[1], dtype=np.float64), matrices, variant)
+    tasks = [(length, start, keep) for length, matrix in matrices.items()
+             for start in range(0, len(matrix), CHUNK)]
+    if workers == 1:
+        _setup(*state)
+        results = list(map(_prune_chunk, tasks))
+    else:
+        from multiprocessing import Pool
+        pool = Pool(workers, initializer=_setup, initargs=state)
+        try:
+            results = pool.map(_prune_chunk, tasks, chunksize=1)
+        finally:
+            pool.terminate()
+
+    # the unigram survivors of every chunk, cut to the overall best keep
+    survivors = [(fit, key) for matrices, fits in results for key, fit in zip(matrices, fits)]
+    survivors.sort(key=lambda s: -s[0])
+    prefix = idx[:PREFIX].tobytes()
+    ranked = []
+    for fit, key in survivors[:keep]:
+        key = analysis.decode(key)
+        plain = analysis.encode(vigenere.shift_codes(key, prefix, True, variant=variant))
+        ranked.append((key, profile.score(plain)))
+    ranked.sort(key=lambda r: -r[1])
+    return ranked
+
+
+def main(argv):
+    description = "Vigenere dictionary attack"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-i', metavar='in-file', help='the ciphertext (- for stdin)', required=True)
+    parser.add_argument('-w', metavar='wordlist', help='candidate keys, one per line', required=True)
+    parser.add_argument('-l', metavar='lang', default='english', help='language profile to score against')
+    parser.add_argument('-n', metavar='count', type=int, default=10, help='keys to print')
+    parser.add_argument('--workers', metavar='N', type=int, default=1, help='worker processes (0: one per core)')
+    parser.add_argument('--variant', choices=vigenere.VARIANTS, default=vigenere.VIGENERE, help='cipher variant (default: vigenere)')
+    args = parser.parse_args(argv)
+
+    idx = analysis.encode(sys.stdin.buffer.read()) if args.i == '-' else analysis.load(args.i)
+    with open(args.w, 'rb') as f:
+        data = f.read()
+    start = time.time()
+    ranked = attack(idx, data, language.load(args.l), workers=args.workers or None, variant=args.variant)
+    elapsed = time.time() - start
+    for key, score in ranked[:args.n]:
+        print("%-20s %.1f" % (key, score))
+    count = data.count(b'\n')
+    sys.stderr.write('%d keys in %.2fs (%.0f keys/s)\n' % (count, elapsed, count / max(elapsed, 1e-9)))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
 """
@@ -20,8 +20,10 @@ solving my tasks.
 .. _Vigenere cipher: http://en.wikipedia.org/wiki/Vigen%C3%A8re_cipher
 """
 
-from collections import defaultdict
-from itertools import chain, imap, izip
+from itertools import chain
+import argparse
+
+import alphabet, instrument, vigenere
 
 
 # Average letter occurence chances in English text.
@@ -35,100 +37,87 @@ p = {
     'Y': .020, 'Z': .001
 }
 
-def crack(cipher, m, details=False):
-    """Crack."""
-    cipher = cipher.upper()
-
-    # Split cipher.
-    y = defaultdict(list)
-    for i, char in enumerate(cipher):
-        y[i % m].append(char)
+def crack(cipher, m, details=False, profile=None):
+    """Crack. Letters are scored against ``profile`` (a language.Profile),
+    or against the English table ``p``."""
+    import analysis
+    if profile is None:
+        ref, desirable = [p[ch] for ch in alphabet.LETTERS], .065
+    else:
+        ref, desirable = profile.freq, profile.coincidence
+    codes = analysis.encode(cipher)
+
+    # Count the letters of every section, and score all 26 key letters
+    # of all sections in one product: r[g] = sum_i p_i * h[(i + g) % 26].
+    counts = analysis.column_histograms(codes, m)[:min(m, len(codes))]
+    scores = analysis.mg_tables(counts, ref)
 
     # Analyze sections separately.
-    for si in xrange(len(y)):
-        section = y[si]
-        section_len = len(section)
-
-        show_headline('section %d' % (si + 1))
-        print wrap(section)
-        print ' -> length: ' , section_len
-
-        # Count letters.
-        c = dict((key, 0) for key in p)
-        for char in section:
-            c[char] += 1
-
-        # Compute letter dispersion.
-        h = dict((key, float(c[key]) / section_len) for key in c)
-
-        # All the magic happens here :)
-        gs = []
-        for g in xrange(26):
-            r = 0
-            letter_g = chr(g + 65)
-            for i in xrange(26):
-                p_i = p[chr(i + 65)]
-                h_ig = h[chr(((i + g) % 26) + 65)]
-                r += p_i * h_ig
-            if details:
-                print " -> '%c' = %.3f" % (letter_g, r)
-            gs.append((letter_g, r))
+    for si, (c, gs) in enumerate(zip(counts, scores)):
+        if details:
+            show_headline('section %d' % (si + 1))
+            print(wrap(alphabet.decode(codes[si::m])))
+            print(' -> length: ' , c.sum())
+            for g, r in enumerate(gs):
+                print(" -> '%c' = %.3f" % (alphabet.LETTERS[g], r))
 
         # Fetch best suiting value.
-        desirable = .065
-        nearest_value = 999
-        nearest_index = 0
-        for i, g in enumerate(gs):
-            difference = abs(desirable - g[1])
-            if difference < nearest_value:
-                nearest_value = difference
-                nearest_index = i
-        print " -> nearest: '%c' by %.3f" % gs[nearest_index]
-        yield gs[nearest_index][0]
+        nearest_index = int(abs(desirable - gs).argmin())
+        instrument.count('keys_evaluated', 26)
+        print(" -> nearest: '%c' by %.3f" % (alphabet.LETTERS[nearest_index], gs[nearest_index]))
+        yield alphabet.LETTERS[nearest_index]
 
 def decipher(cipher, keyword):
-    """Decipher the text using ``keyword``."""
-    cipher = cipher.upper()
-    keyword = keyword.upper()
-    keyword_values = map(ord, keyword)
-    keyword_len = len(keyword)
-    for i, char in enumerate(cipher):
-        char = ord(char) - keyword_values[i % keyword_len] + 65
-        if char < 65:
-            char += 26
-        char += 32  # Lowercase; this way instead of `.upper()`.
-        yield chr(char)
+    """Decipher the text using ``keyword``, yielding lowercase letters."""
+    return iter(vigenere.vcd(keyword, cipher).lower())
 
 def show_headline(title, width=47, fillchar='='):
     """Display a formatted headline with fixed width."""
     beginning = (fillchar * 3) + ('( %s )' % title)
-    print '\n' + beginning.ljust(width, fillchar)
+    print('\n' + beginning.ljust(width, fillchar))
 
 def group(iterable, n, padvalue=''):
     """Group ``iterable`` into chunks of ``n`` items.
 
     The last chunk is padded with ``padvalue``, if necessary.
     """
-    return izip(*[chain(iterable, [padvalue] * (n - 1))] * n)
+    return zip(*[chain(iterable, [padvalue] * (n - 1))] * n)
 
 def wrap(string, blocks_per_line=8, block_width=5):
     """Wrap long lines into cute little blocks."""
-    blocks = imap(''.join, group(string, block_width))
-    lines = imap(' '.join, group(blocks, blocks_per_line))
+    blocks = map(''.join, group(string, block_width))
+    lines = map(' '.join, group(blocks, blocks_per_line))
     return '\n'.join(lines)
 
-def main(cipher, kw_len):
-    print 'Cracking the Vigenere cipher.\n'
-    details = (raw_input('Show details? [y/N] ') in ('y', 'Y'))
+def main(cipher, kw_len, fmt=None, profile=None):
+    print('Cracking the Vigenere cipher.\n')
+    details = (input('Show details? [y/N] ') in ('y', 'Y'))
+    if fmt:
+        instrument.enable()
+    instrument.count('bytes_processed', len(cipher))
     show_headline('cipher')
-    print wrap(cipher)
-    print ' -> assumed keyword length:', kw_len
-    keyword = ''.join(crack(cipher, kw_len, details))
+    print(wrap(cipher))
+    print(' -> assumed keyword length:', kw_len)
+    with instrument.stage('column_scoring'):
+        keyword = ''.join(crack(cipher, kw_len, details, profile))
+    with instrument.stage('decrypt'):
+        plain = ''.join(decipher(cipher, keyword))
     show_headline('deciphered')
-    print wrap(decipher(cipher, keyword))
-    print ' -> keyword: "%s"\n' % keyword
+    print(wrap(plain))
+    print(' -> keyword: "%s"\n' % keyword)
+    if fmt:
+        instrument.emit(fmt)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crack the example ciphers')
+    parser.add_argument('--profile', choices=instrument.FORMATS, help='report stage timings and counters to stderr')
+    parser.add_argument('-l', metavar='lang', help='language profile to score against (default: built-in English table)')
+    args = parser.parse_args()
+    profile = None
+    if args.l:
+        import language
+        profile = language.load(args.l)
+
     # Example 1
     cipher = 'KCCPKBGUFDPHQTYAVINRRTMVGRKDNBVFDETDGILTXRGUDDKOTFMBPVGEGLTGCKQRACQCWDNAWCRXIZAKFTLEWRPTYCQKYVXCHKFTPONCQQRHJVAJUWETMCMSPKQDYHJVDAHCTRLSVSKCGCZQQDZXGSFRLSWCWSJTBHAFSIASPRJAHKJRJUMVGKMITZHFPDISPZLVLGWTFPLKKEBDPGCEBSHCTJRWXBAFSPEZQNRWXCVYCGAONWDDKACKAWBBIKFTIOVKCGGHJVLNHIFFSQESVYCLACNVRWBBIREPBBVFEXOSCDYGZWPFDTKFQIYCWHJVLNHIQIBTKHJVNPIST'
     kw_len = 6
@@ -140,4 +129,4 @@ if __name__ == '__main__':
     ##cipher = 'CHREEVOAHMAERATBIAXXWTNXBEEOPHBSBQMQEQERBWRVXUOAKXAOSXXWEAHBWGJMMQMNKGRFVGXWTRZXWIAKLXFPSKAUTEMNDCMGTSXMXBTUIADNGMGPSRELXNJELXVRVPRTULHDNQWTWDTYGBPHXTFALJHASVBFXNGLLCHRZBWELEKMSJIKNBHWRJGNMGJSGLXFEYPHAGNRBIEQJTAMRVLCRREMNDGLXRRIMGNSNRWCHRQHAEYEVTAQEBBIPEEWEVKAKOEWADREMXMTBHHCHRTKDNVRZCHRCLQOHPWQAIIWXNRMGWOIIFKEE'
     ##kw_len = 5
 
-    main(cipher, kw_len)
\ No newline at end of file
+    main(cipher, kw_len, args.profile, profile)
\ No newline at end of file
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 """Functions for encrypting and decrypting text using
    the Vigenere square cipher. See:
@@ -8,17 +8,16 @@
    http://en.wikipedia.org/wiki/Index_of_coincidence
 """
 
-from __future__ import division
-from collections import Counter
-from math import fabs
 from string import ascii_lowercase
-from scipy.stats import pearsonr
-from numpy import matrix
+import argparse
+import numpy as np
+import alphabet, cache, vigenere
 from os import system
 
 #Define some constants:
 LETTER_CNT = 26
 ENGLISH_IC = 1.73
+IC_TOLERANCE = .25  #How far below ENGLISH_IC a keyword length's IC may be
 
 #Cornell English letter frequecy
 #http://www.math.cornell.edu/~mec/2003-2004/cryptography/subs/frequencies.html
@@ -28,12 +27,14 @@ ENGLISH_FREQ = [0.1202, 0.0910, 0.0812, 0.0768, 0.0731, 0.0695, 0.0628,
                 0.0230, 0.0211, 0.0209, 0.0203, 0.0182, 0.0149, 0.0111,
                 0.0069, 0.0017, 0.0011, 0.0010, 0.0007]
 ENGLISH_DICT = dict(zip(list(ENGLISH_LETTERS), ENGLISH_FREQ))
+ENGLISH_VECTOR = np.array([ENGLISH_DICT[ch] for ch in ascii_lowercase])
 MAX_LEN = 10    #Maximum keyword length
+SAMPLE_LEN = 1 << 17    #Letters used to estimate IC of longer texts
 
 
 def scrub_string(str):
     """Remove non-alphabetic characters and convert string to lower case. """
-    return ''.join(ch for ch in str if ch.isalpha()).lower()
+    return alphabet.clean(str, lower=True)
 
 
 def string_to_numbers(str):
@@ -69,68 +70,132 @@ def shift_string_by_letter(str, ch, direction):
 
 def chunk_string(str):
     """Add a blank between each block of five characters in str."""
-    return ' '.join(str[i:i+5] for i in xrange(0, len(str), 5))
+    return ' '.join(str[i:i+5] for i in range(0, len(str), 5))
 
 
 def crypt(text, passphrase, which):
     """Encrypt or decrypt the text, depending on whether which = 1
-    or which = -1.
+    or which = -1. As in shift_string_by_letter, a passphrase letter
+    shifts by its position plus one (a by 1), so the key handed to the
+    cipher engine is the passphrase moved on by one letter.
     """
-    text = scrub_string(text)
-    passphrase = scrub_string(passphrase)
-    letters = (shift_string_by_letter(ch, passphrase[i % len(passphrase)], which)
-                   for i, ch in enumerate(text))
-    return ''.join(letters)
+    assert which in {1, -1}
+    key = vigenere.shift('B', passphrase)
+    return vigenere.shift(key, text, decrypt=which == -1).decode('ascii').lower()
+
+
+def letter_codes(text):
+    """Scrub text once and return its letters as an array of 0..25;
+    arrays that are already encoded are returned as they are.
+    """
+    if isinstance(text, np.ndarray):
+        return text
+    return np.frombuffer(alphabet.encode(text), dtype=np.uint8).astype(np.intp)
+
+
+def column_IC(codes, ncol):
+    """Average index of coincidence of the ncol columns of an array of
+    letter codes. Each letter is tagged with its column (column*26 + code)
+    by laying the text out as rows of ncol, and one bincount gives every
+    column's letter counts.
+    """
+    n = len(codes) - len(codes) % ncol
+    tagged = (codes[:n].reshape(-1, ncol) + LETTER_CNT * np.arange(ncol)).ravel()
+    tail = codes[n:] + LETTER_CNT * np.arange(len(codes) - n)
+    counts = np.bincount(np.concatenate([tagged, tail]),
+                         minlength=ncol * LETTER_CNT).reshape(ncol, LETTER_CNT)
+    N = counts.sum(axis=1)
+    return ((counts * (counts - 1)).sum(axis=1)
+            / np.maximum(N*(N - 1)/LETTER_CNT, 1)).mean()
 
 
 def IC(text, ncol):
     """Divide the text into ncol columns and return the average index
     of coincidence across the columns.
     """
-    text = scrub_string(text)
-    A = str_to_matrix(scrub_string(text), ncol)
-    cum = 0
-    for col in A:
-        N = len(col)
-        cum += (sum(n*(n - 1) for n in Counter(col).values())
-                / (N*(N - 1)/LETTER_CNT))
-    return cum/ncol
-
-
-def keyword_length(text):
-    """Determine keyword length by finding the length that makes
-    IC closest to the English plaintext value of 1.73.
+    return column_IC(letter_codes(text), ncol)
+
+
+def keyword_lengths(text, max_len=MAX_LEN):
+    """Rank keyword lengths 1..max_len - 1 by their IC. Returns (length,
+    IC) pairs.
+
+    Every multiple of the keyword length has an English IC too, so the
+    lengths whose IC is within IC_TOLERANCE of the English plaintext value
+    of 1.73 (or above it) come first, shortest first; the rest follow by
+    how close their IC is to 1.73.
+
+    The text is scrubbed and encoded once; long texts are estimated from
+    their first SAMPLE_LEN letters.
+    """
+    codes = letter_codes(text)[:SAMPLE_LEN]
+    ics = np.array([column_IC(codes, ncol) for ncol in range(1, max_len)])
+    english = ics >= ENGLISH_IC - IC_TOLERANCE
+    order = np.lexsort((np.where(english, 0, np.abs(ics - ENGLISH_IC)), ~english))
+    return [(int(i) + 1, float(ics[i])) for i in order]
+
+
+def keyword_length(text, max_len=MAX_LEN):
+    """Determine keyword length: the shortest length that makes the
+    IC close to the English plaintext value of 1.73.
     """
-    text = scrub_string(text)
-    a = [fabs(IC(text, ncol) - ENGLISH_IC) for ncol in xrange(1, MAX_LEN)]
-    return a.index(min(a)) + 1
+    return keyword_lengths(text, max_len)[0][0]
+
 
+def pearson(rows, y):
+    """Pearson correlation of every row of rows with the vector y."""
+    rows = np.atleast_2d(rows).astype(float)
+    x = rows - rows.mean(axis=1)[:, None]
+    y = np.asarray(y, dtype=float) - np.mean(y)
+    return x.dot(y) / np.sqrt((x * x).sum(axis=1) * y.dot(y))
+
+
+def letter_counts(letter_list):
+    """Counts of a..z in a list (or string) of lowercase letters, or in
+    an array of letter codes.
+    """
+    if not isinstance(letter_list, np.ndarray):
+        letter_list = letter_codes(''.join(letter_list))
+    return np.bincount(letter_list, minlength=LETTER_CNT)
 
-def correlation(letter_list):
+
+def frequencies(profile=None):
+    """Letter frequencies a..z of a language.Profile, or ENGLISH_VECTOR."""
+    return ENGLISH_VECTOR if profile is None else profile.freq
+
+
+def correlation(letter_list, profile=None):
     """Return the correlation of the frequencies of the letters
-    in the list with the English letter frequency.
+    in the list with the letter frequency of the language (English
+    unless a language.Profile is given).
     """
-    counts = Counter(letter_list)
-    text_freq = [counts[ch]/len(letter_list) for ch in ascii_lowercase]
-    english_freq = [ENGLISH_DICT[ch] for ch in ascii_lowercase]
-    return pearsonr(text_freq, english_freq)[0]
+    return pearson(letter_counts(letter_list), frequencies(profile))[0]
 
 
-def find_keyword_letter(letter_list):
+def find_keyword_letter(letter_list, profile=None):
     """Return a letter of the keyword, given every nth character
     of the ciphertext, where n = keyword length.
+
+    Shifting the text left by num turns its letter counts into
+    counts[(i + num) % 26], so all 26 shifts are rows of one rolled
+    matrix and are correlated with the language in a single product.
     """
-    str = ''.join(letter_list)
-    cors = [correlation(shift_string_by_number(str, -num))
-            for num in xrange(1, LETTER_CNT + 1)]
-    return ascii_lowercase[cors.index(max(cors))]
+    counts = letter_counts(letter_list)
+    i = np.arange(LETTER_CNT)
+    shifted = counts[(i[None, :] + i[:, None] + 1) % LETTER_CNT]
+    cors = pearson(shifted, frequencies(profile))
+    return ascii_lowercase[cors.argmax()]
 
 
-def find_keyword(ciphertext, keyword_length):
-    """Return the keyword, given its length and the ciphertext."""
-    A = str_to_matrix(scrub_string(ciphertext), keyword_length)
-    return ''.join(
-        [find_keyword_letter(A[j]) for j in xrange(keyword_length)])
+def find_keyword(ciphertext, keyword_length, profile=None):
+    """Return the keyword, given its length and the ciphertext (text or
+    letter codes), scored against profile (default: English). Keywords
+    are cached by ciphertext.
+    """
+    codes = np.ascontiguousarray(letter_codes(ciphertext))
+    params = [keyword_length, profile and profile.name]
+    return cache.default.memo('find_keyword', codes, params, lambda: ''.join(
+        [find_keyword_letter(codes[j::keyword_length], profile) for j in range(keyword_length)]))
 
 
 def str_to_matrix(str, ncol):
@@ -139,12 +204,7 @@ def str_to_matrix(str, ncol):
     >>> str_to_matrix('abcdefghijk', 4)
     [['a', 'e', 'i'], ['b', 'f', 'j'], ['c', 'g', 'k'], ['d', 'h']]
     """
-    A = [list(str[i:i + ncol]) for i in xrange(0, len(str), ncol)]
-    stub = A.pop()
-    B = matrix(A).T.tolist()
-    for i, ch in enumerate(stub):
-        B[i] += ch
-    return B
+    return [list(str[j::ncol]) for j in range(ncol)]
 
 
 def test_functions():
@@ -179,14 +239,22 @@ def test_functions():
 
 
 if __name__ == '__main__':
-    print 'Calculating...'
+    parser = argparse.ArgumentParser(description='Break the Moby Dick example')
+    parser.add_argument('-l', metavar='lang', help='language profile to score against (default: Cornell English table)')
+    args = parser.parse_args()
+    profile = None
+    if args.l:
+        import language
+        profile = language.load(args.l)
+    print('Calculating...')
     with open ("plaintext.txt", "r") as infile:
         plaintext = infile.read().replace('\n', ' ')
     passphrase = 'Moby Dick'
     ciphertext =  crypt(plaintext, passphrase, 1)
-    kw_len = keyword_length(ciphertext)
-    kw = find_keyword(ciphertext, kw_len)
-    print 'Keyword length is {0}.'.format(kw_len)
-    print 'The keyword is {0}.'.format(kw)
+    codes = letter_codes(ciphertext)
+    kw_len = keyword_length(codes)
+    kw = find_keyword(codes, kw_len, profile)
+    print('Keyword length is {0}.'.format(kw_len))
+    print('The keyword is {0}.'.format(kw))
     system("""bash -c 'read -s -n 1 -p "Press any key print the decrypted text..."'""")
-    print crypt(ciphertext, kw, -1)
\ No newline at end of file
+    print(crypt(ciphertext, kw, -1))
\ No newline at end of file
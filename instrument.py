@@ -0,0 +1,129 @@
+"""Per-stage timings and counters for the breaker pipeline.
+
+Recording is off until enable() is called; until then stage() returns a
+shared no-op context manager and count() returns after one flag check, so
+instrumented hot paths cost next to nothing. Reports are JSON or
+Prometheus text exposition format.
+
+observe() adds latencies to fixed-bucket histograms; it takes a lock, as
+the server records them from many threads.
+"""
+
+import sys, json, time, threading
+
+enabled = False
+timings = {}    # stage -> [calls, seconds]
+counters = {}   # name -> total
+histograms = {} # name -> [count per bucket..., count, seconds]
+
+# upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+_lock = threading.Lock()
+
+FORMATS = ('json', 'prometheus')
+
+
+class _Off(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_OFF = _Off()
+
+
+class _Stage(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        t = timings.setdefault(self.name, [0, 0.0])
+        t[0] += 1
+        t[1] += time.time() - self.start
+        return False
+
+
+def stage(name):
+    """Context manager timing one run of a pipeline stage."""
+    return _Stage(name) if enabled else _OFF
+
+
+def count(name, n=1):
+    """Add n to a counter."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def observe(name, seconds):
+    """Add one latency to a histogram."""
+    if enabled:
+        with _lock:
+            h = histograms.get(name)
+            if h is None:
+                h = histograms[name] = [0] * len(BUCKETS) + [0, 0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += 1
+            h[-1] += seconds
+
+
+def enable():
+    """Start recording from scratch."""
+    global enabled
+    enabled = True
+    timings.clear()
+    counters.clear()
+    histograms.clear()
+
+
+def _cumulative(h):
+    total, out = 0, []
+    for n in h[:len(BUCKETS)]:
+        total += n
+        out.append(total)
+    return out
+
+
+def report():
+    return {'stages': dict((name, {'calls': calls, 'seconds': seconds})
+                           for name, (calls, seconds) in timings.items()),
+            'counters': dict(counters),
+            'histograms': dict((name, {'buckets': list(zip(BUCKETS, _cumulative(h))),
+                                       'count': h[-2], 'seconds': h[-1]})
+                               for name, h in histograms.items())}
+
+
+def prometheus(prefix='vigenere'):
+    lines = ['# TYPE %s_stage_seconds_total counter' % prefix]
+    for name, (calls, seconds) in sorted(timings.items()):
+        lines.append('%s_stage_seconds_total{stage="%s"} %.6f' % (prefix, name, seconds))
+    lines.append('# TYPE %s_stage_calls_total counter' % prefix)
+    for name, (calls, seconds) in sorted(timings.items()):
+        lines.append('%s_stage_calls_total{stage="%s"} %d' % (prefix, name, calls))
+    for name, value in sorted(counters.items()):
+        lines.append('# TYPE %s_%s_total counter' % (prefix, name))
+        lines.append('%s_%s_total %d' % (prefix, name, value))
+    if histograms:
+        lines.append('# TYPE %s_latency_seconds histogram' % prefix)
+    for name, h in sorted(histograms.items()):
+        for bound, n in zip(BUCKETS, _cumulative(h)):
+            lines.append('%s_latency_seconds_bucket{name="%s",le="%g"} %d' % (prefix, name, bound, n))
+        lines.append('%s_latency_seconds_bucket{name="%s",le="+Inf"} %d' % (prefix, name, h[-2]))
+        lines.append('%s_latency_seconds_sum{name="%s"} %.6f' % (prefix, name, h[-1]))
+        lines.append('%s_latency_seconds_count{name="%s"} %d' % (prefix, name, h[-2]))
+    return '\n'.join(lines) + '\n'
+
+
+def emit(fmt, out=sys.stderr):
+    """Write the report in one of FORMATS."""
+    if fmt == 'prometheus':
+        out.write(prometheus())
+    else:
+        out.write(json.dumps(report(), sort_keys=True) + '\n')
@@ -0,0 +1,144 @@
+"""Key length estimation merging Kasiski, Friedman and column IC.
+
+Three kinds of evidence are turned into one ranked list of candidate
+lengths whose confidences sum to one:
+
+- Kasiski: spacings of repeated n-grams that the length divides beyond
+  chance (repeats.key_lengths); strong on long texts;
+- column IC: the mean index of coincidence of the columns at each
+  period, near the language's only at multiples of the key length; a
+  period is credited only for what its divisors do not already explain;
+- Friedman: the length estimated from the IC of the whole text, which
+  narrows the range but is too rough to pick a length on its own.
+
+Column IC is the costly part. Periods are scanned from 1 upwards on a
+sample of the text and the scan stops at the first period whose IC is
+close to the language's: that period dominates, as no later one can do
+better than its multiples.
+
+Cracking is then run on a shortlist only (see shortlist and best_key).
+
+Beaufort and variant Beaufort keep the Vigenere period, and their
+repeats and column IC are the same as Vigenere's. Autokey has no period
+at all; autokey_key tries every primer length instead.
+"""
+
+import numpy as np
+import analysis, instrument, repeats, vigenere
+
+MAX_LENGTH = repeats.MAX_LENGTH
+SAMPLE = 1 << 18        # letters used for column IC
+MIN_COLUMN = 8          # fewest letters per column for a period to be scanned
+RANDOM_IC = 1 / 26.
+DOMINANT = .75          # IC score (0 random, 1 language) that ends the scan
+SHARPNESS = 8           # power applied to IC scores and relative Kasiski scores
+WEIGHTS = {'kasiski': .4, 'ic': .5, 'friedman': .1}
+TOP = 3                 # most lengths cracked
+COVER = .8              # cracking stops once the shortlist holds this confidence
+FIT_MARGIN = .002       # fit a less likely length must win by
+AUTOKEY_LENGTH = 20     # longest autokey primer tried
+
+
+def ic_scores(ics, coincidence=.065):
+    """Column IC on a 0 (random) to 1 (language) scale."""
+    return np.clip((ics - RANDOM_IC) / (coincidence - RANDOM_IC), 0, 1)
+
+
+def scan(idx, max_length=MAX_LENGTH, coincidence=.065):
+    """IC scores of periods 1, 2, ... up to the first dominant one."""
+    idx = idx[:SAMPLE]
+    scores = []
+    for period in range(1, max(1, min(max_length, len(idx) // MIN_COLUMN)) + 1):
+        ic = analysis.coincidence(analysis.column_histograms(idx, period)).mean()
+        scores.append(float(ic_scores(ic, coincidence)))
+        if scores[-1] >= DOMINANT:
+            break
+    instrument.count('periods_scanned', len(scores))
+    return np.array(scores)
+
+
+def _normalized(evidence):
+    total = evidence.sum()
+    return evidence / total if total > 0 else None
+
+
+def candidates(idx, max_length=MAX_LENGTH, coincidence=.065, min_size=3, max_size=5):
+    """Key lengths ranked by confidence, as (length, confidence) pairs;
+    lengths without any evidence are left out."""
+    max_length = max(1, min(max_length, len(idx) // 2))
+    kasiski = repeats.key_lengths(idx, min_size, max_size, max(max_length, 2))
+    scores = scan(idx, max_length, coincidence)
+    return combine(kasiski, scores, analysis.friedman(idx)[1], max_length)
+
+
+def combine(kasiski, scores, estimate, max_length=MAX_LENGTH):
+    """candidates() from the evidence itself: Kasiski (length, score)
+    pairs, column IC scores of periods 1, 2, ... and the Friedman
+    estimate."""
+    lengths = np.arange(1, max_length + 1)
+    sources = {}
+
+    evidence = np.zeros(max_length)
+    for length, score in kasiski:
+        if length <= max_length:
+            evidence[length - 1] = max(score, 0)
+    if evidence.any():
+        sources['kasiski'] = _normalized((evidence / evidence.max()) ** SHARPNESS)
+
+    scores = np.asarray(scores[:max_length]) ** SHARPNESS
+    ic = np.zeros(max_length)
+    for n, score in enumerate(scores):
+        divisors = [scores[d - 1] for d in range(1, n + 1) if (n + 1) % d == 0]
+        ic[n] = score * (1 - max(divisors or [0]))
+    sources['ic'] = _normalized(ic)
+
+    if np.isfinite(estimate) and estimate > 0:
+        sources['friedman'] = _normalized(np.exp(-.5 * ((lengths - estimate) / (.5 * estimate + 1)) ** 2))
+
+    confidence = np.zeros(max_length)
+    for name, evidence in sources.items():
+        if evidence is not None:
+            confidence += WEIGHTS[name] * evidence
+    confidence = _normalized(confidence)
+    if confidence is None:
+        return []
+    ranked = np.argsort(-confidence, kind='mergesort')
+    return [(int(lengths[i]), float(confidence[i])) for i in ranked if confidence[i] > 0]
+
+
+def shortlist(ranked, top=TOP, cover=COVER):
+    """Leading candidates until their confidence reaches cover, at most top."""
+    out, total = [], 0.
+    for length, confidence in ranked[:top]:
+        out.append(length)
+        total += confidence
+        if total >= cover:
+            break
+    return out
+
+
+def best_key(idx, lengths, crack, ref=analysis.ENGLISH, margin=FIT_MARGIN, variant=vigenere.VIGENERE):
+    """Crack each length in turn with crack(length) -> key indices and keep
+    the key whose decryption fits ref best. Lengths are taken as ranked: a
+    later one has to win by margin, so a multiple of the key length (which
+    decrypts just as well) does not replace it. Returns (key, fit)."""
+    best, best_fit = None, None
+    for length in lengths:
+        key = np.asarray(crack(length))
+        fit = analysis.fit(idx, key, ref, variant)
+        if best is None or fit > best_fit + margin:
+            best, best_fit = key, fit
+    return best, best_fit
+
+
+def autokey_key(idx, ref=analysis.ENGLISH, coincidence=.065, max_length=AUTOKEY_LENGTH):
+    """Autokey primer cracked at every length up to max_length on a sample
+    of the text, keeping the best fit (shortest first, as best_key); a
+    wrong length leaves every column unreadable. Returns (key, fit), or
+    (None, None) with fewer than MIN_COLUMN letters, as candidates()
+    gives no lengths for a periodic text that short."""
+    idx = idx[:SAMPLE]
+    lengths = range(1, min(max_length, len(idx) // MIN_COLUMN) + 1)
+    instrument.count('periods_scanned', len(lengths))
+    return best_key(idx, lengths, lambda n: analysis.crack(idx, n, ref, coincidence, vigenere.AUTOKEY)[0],
+                    ref, variant=vigenere.AUTOKEY)
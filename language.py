@@ -0,0 +1,124 @@
+"""Language profiles for scoring candidate plaintexts.
+
+A profile holds unigram, bigram and quadgram log10-probability tables
+(float32) built from a training corpus. Tables are saved as .npy files
+under profiles/<name>/, or under the user cache directory when the source
+tree is not writable, and memory-mapped on load; loaded profiles are
+cached for the life of the process, so crackers never rebuild them per
+call. A profile directory is written in full under a temporary name and
+renamed into place, so a reader never sees half of one.
+
+Build a profile for a new language with:
+
+    python language.py french corpus1.txt corpus2.txt
+"""
+
+import os, sys, shutil, tempfile
+import numpy as np
+import analysis, repeats
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                         'vigenere', 'profiles')
+ORDERS = (1, 2, 4)
+
+# Built on first use when no saved profile exists.
+CORPORA = {
+    'english': ['article.txt', 'plaintext.txt'],
+}
+
+_cache = {}
+
+
+class Profile(object):
+    """Log-probability tables of one language, indexed by n-gram code."""
+
+    def __init__(self, name, tables):
+        self.name = name
+        self.tables = tables
+        self.freq = 10 ** np.asarray(tables[1], dtype=np.float64)
+        self.freq /= self.freq.sum()
+        # expected index of coincidence, the M_g value of the right key letter
+        self.coincidence = float((self.freq ** 2).sum())
+
+    def score(self, idx, order=4):
+        """Log-likelihood of a letter-index array under the n-gram model."""
+        if len(idx) < order:
+            return 0.0
+        return float(self.tables[order][repeats.ngram_codes(idx, order)].sum())
+
+
+def count(paths, order):
+    """N-gram counts of the letters in the given corpus files."""
+    counts = np.zeros(26 ** order)
+    for path in paths:
+        with open(path, 'rb') as f:
+            idx = analysis.encode(f.read())
+        counts += np.bincount(repeats.ngram_codes(idx, order), minlength=26 ** order)
+    return counts
+
+
+def build(name, paths):
+    """Profile trained on the corpus files; unseen n-grams get a floor of 0.01 counts."""
+    tables = {}
+    for order in ORDERS:
+        counts = count(paths, order)
+        tables[order] = np.log10(np.maximum(counts, 0.01) / max(counts.sum(), 1)).astype(np.float32)
+    return Profile(name, tables)
+
+
+def _files(path):
+    return [os.path.join(path, '%d.npy' % order) for order in ORDERS]
+
+
+def save(profile, directory=PROFILE_DIR):
+    """Write the profile's tables under directory/<name>, replacing any
+    saved profile of that name in one rename."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, profile.name)
+    tmp = tempfile.mkdtemp(prefix='.%s.' % profile.name, dir=directory)
+    try:
+        for order, table in profile.tables.items():
+            np.save(os.path.join(tmp, '%d.npy' % order), np.asarray(table, dtype=np.float32))
+        if os.path.isdir(path):
+            # a directory can only be renamed over an empty one
+            old = tempfile.mkdtemp(prefix='.%s.' % profile.name, dir=directory)
+            os.replace(path, os.path.join(old, profile.name))
+            os.replace(tmp, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load(name, directory=None):
+    """Cached profile by name, looked up in directory (default: PROFILE_DIR,
+    then CACHE_DIR); built from CORPORA and saved to the first writable one
+    if missing."""
+    if name not in _cache:
+        directories = [directory] if directory else [PROFILE_DIR, CACHE_DIR]
+        for path in (os.path.join(d, name) for d in directories):
+            if all(os.path.isfile(f) for f in _files(path)):
+                tables = dict((order, np.load(f, mmap_mode='r')) for order, f in zip(ORDERS, _files(path)))
+                _cache[name] = Profile(name, tables)
+                break
+        else:
+            if name not in CORPORA:
+                raise ValueError("unknown language profile: %s" % name)
+            here = os.path.dirname(os.path.abspath(__file__))
+            _cache[name] = build(name, [os.path.join(here, p) for p in CORPORA[name]])
+            for d in directories:
+                try:
+                    save(_cache[name], d)
+                    break
+                except OSError:
+                    continue    # read-only; the profile is still usable
+    return _cache[name]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: language.py name corpus [corpus ...]")
+    save(build(sys.argv[1], sys.argv[2:]))
@@ -0,0 +1,147 @@
+"""Incremental key analysis of ciphertext that arrives in chunks.
+
+An Analyser keeps, for all the text seen so far:
+
+- the letter counts of every column at every period up to max_length,
+  from which the column IC values, the Friedman estimate and the key of
+  any length follow;
+- for each n-gram size, the last position of every n-gram and the factor
+  histogram of the spacings between consecutive occurrences, which is
+  what repeats.key_lengths counts.
+
+A chunk updates all of it in time linear in its length, and nothing grows
+with the stream: the last-position tables have a fixed number of slots
+(n-grams of more letters than fit are hashed into them, so a collision
+can lose a repeat). Key length candidates and the key are read off the
+counts at any time, as keylength and break.py do for a whole text.
+
+    analyser = Analyser(on_stable=report)
+    for chunk in chunks:
+        analyser.feed(chunk)
+"""
+
+import numpy as np
+import analysis, instrument, keylength, repeats, vigenere
+
+CHUNK_SIZE = 1 << 16    # bytes read at a time from a stream
+SLOTS = 1 << 20         # last-position slots per n-gram size
+STABLE = 4              # updates in a row with the same key before on_stable
+
+
+class Analyser(object):
+    """Running key length and key estimate of a ciphertext stream."""
+
+    def __init__(self, max_length=keylength.MAX_LENGTH, min_size=3, max_size=5,
+                 profile=None, on_stable=None, stable=STABLE, variant=vigenere.VIGENERE):
+        if variant not in vigenere.PERIODIC:
+            raise ValueError("not a periodic variant: %s" % variant)
+        self.variant = variant
+        self.max_length = max_length
+        self.sizes = range(min_size, max_size + 1)
+        self.ref, self.coincidence = (profile.freq, profile.coincidence) if profile else (analysis.ENGLISH, .065)
+        self.on_stable, self.stable = on_stable, stable
+        self.letters = 0
+        self.columns = [np.zeros((period, 26), dtype=np.int64) for period in range(1, max_length + 1)]
+        self.factors = np.zeros(max_length + 1)
+        self.codes, self.positions = {}, {}
+        for size in self.sizes:
+            self.codes[size] = np.full(min(26 ** size, SLOTS), -1, dtype=np.int64)
+            self.positions[size] = np.zeros(len(self.codes[size]), dtype=np.int64)
+        self.tail = np.zeros(0, dtype=np.uint8)
+        self.estimate, self.runs = None, 0
+
+    def feed(self, text):
+        """Add a chunk of ciphertext (non-letters are ignored); returns
+        the current estimate."""
+        return self.update(analysis.encode(text))
+
+    def update(self, idx):
+        """Add a chunk of letter indices; returns the current estimate."""
+        idx = np.asarray(idx, dtype=np.uint8)
+        if not len(idx):
+            return self.estimate
+        steps = np.arange(len(idx))
+        counts = {}
+        for period in range(self.max_length, 0, -1):
+            if 2 * period <= self.max_length:
+                # columns of a period are pairs of columns of its double
+                counts[period] = counts[2 * period].reshape(2, period, 26).sum(axis=0)
+            else:
+                cols = (steps + self.letters % period) % period
+                counts[period] = np.bincount(cols * 26 + idx, minlength=period * 26).reshape(period, 26)
+            self.columns[period - 1] += counts[period]
+        self._repeats(idx)
+        self.letters += len(idx)
+        text = np.concatenate([self.tail, idx])
+        self.tail = text[max(0, len(text) - (self.sizes[-1] - 1)):]
+        instrument.count('letters_processed', len(idx))
+        return self._settle()
+
+    def _repeats(self, idx):
+        # n-grams ending in this chunk, including those starting in the
+        # tail of the last one, against the last position of each n-gram
+        text = np.concatenate([self.tail, idx])
+        start = self.letters - len(self.tail)
+        for size in self.sizes:
+            skip = max(len(self.tail) - size + 1, 0)
+            codes = repeats.ngram_codes(text, size)[skip:]
+            if not len(codes):
+                continue
+            table, last = self.codes[size], self.positions[size]
+            # (slot, position) packed into one int64 sorts faster than argsort
+            bits = max(len(codes) - 1, 1).bit_length()
+            packed = (codes % len(table) << bits) | np.arange(len(codes))
+            packed.sort()
+            order, slots = packed & ((1 << bits) - 1), packed >> bits
+            codes, pos = codes[order], start + skip + order
+            first = np.ones(len(slots), dtype=bool)
+            first[1:] = slots[1:] != slots[:-1]
+            before = np.where(first, table[slots], np.roll(codes, 1))
+            spacing = pos - np.where(first, last[slots], np.roll(pos, 1))
+            spacing = spacing[(before == codes) & (spacing <= repeats.MAX_SPACING)]
+            self.factors = repeats.factor_histogram(spacing, self.max_length, self.factors)
+            final = np.roll(first, -1)
+            table[slots[final]] = codes[final]
+            last[slots[final]] = pos[final]
+
+    def candidates(self):
+        """Key lengths ranked by confidence, as keylength.candidates."""
+        max_length = max(1, min(self.max_length, self.letters // 2))
+        periods = max(1, min(max_length, self.letters // keylength.MIN_COLUMN))
+        ics = np.array([analysis.coincidence(hist).mean() for hist in self.columns[:periods]])
+        scores = keylength.ic_scores(ics, self.coincidence)
+        estimate = analysis.friedman_counts(self.columns[0][0])[1]
+        return keylength.combine(repeats.rank_lengths(self.factors), scores, estimate, max_length)
+
+    def key(self, lengths):
+        """Best key (as keylength.best_key) over lengths, as (key, fit)."""
+        best, best_fit = None, None
+        for length in lengths:
+            hists = self.columns[length - 1]
+            key = analysis.crack_columns(hists, self.ref, self.coincidence, self.variant)[0]
+            fit = analysis.fit_columns(hists, key, self.ref, self.variant)
+            if best is None or fit > best_fit + keylength.FIT_MARGIN:
+                best, best_fit = key, fit
+        return best, best_fit
+
+    def result(self, top=keylength.TOP):
+        """Current estimate in batch.analyse's format, with the number of
+        letters it is based on."""
+        ranked = self.candidates() if self.letters > 1 else []
+        lengths = keylength.shortlist(ranked, top)
+        if not lengths:
+            return {'letters': self.letters, 'key_lengths': [], 'error': 'too little ciphertext'}
+        key, fit = self.key(lengths)
+        return {'letters': self.letters, 'key_lengths': ranked[:top],
+                'key': analysis.decode(key), 'score': fit}
+
+    def _settle(self):
+        # on_stable fires once the key has survived `stable` updates, and
+        # again whenever it settles on a different key
+        estimate = self.result()
+        same = self.estimate is not None and estimate.get('key') == self.estimate.get('key')
+        self.runs = self.runs + 1 if same else 1
+        self.estimate = estimate
+        if self.runs == self.stable and 'key' in estimate and self.on_stable:
+            self.on_stable(estimate)
+        return estimate
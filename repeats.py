@@ -0,0 +1,92 @@
+"""Repeated n-gram finder for the Kasiski examination.
+
+All n-grams of the largest size are coded base 26 and sorted once, which
+puts equal n-grams next to each other like a suffix array cut off at
+``max_size`` letters. Every shorter size is then read off the same order,
+because n-grams sharing a prefix are contiguous in it.
+"""
+
+import numpy as np
+import instrument
+
+MAX_LENGTH = 40         # longest key length reported
+MAX_SPACING = 1 << 20   # spacings beyond this are ignored
+MAX_SCAN = 1 << 22      # letters scanned for repeats; plenty for any key
+
+
+def ngram_codes(idx, size):
+    """Base-26 code of every n-gram of ``size`` letters (size <= 13)."""
+    if not 0 < size <= 13:
+        raise ValueError("n-gram size must be between 1 and 13")
+    n = max(len(idx) - size + 1, 0)
+    codes = np.zeros(n, dtype=np.int64)
+    for t in range(size):
+        codes = codes * 26 + idx[t:t + n]
+    return codes
+
+
+def repeat_spacings(idx, min_size=3, max_size=5):
+    """Distances between neighbouring occurrences of repeated n-grams.
+
+    Yields (size, spacings) for every size from min_size to max_size; the
+    spacings of a size are those of pairs sharing at least that many letters.
+    """
+    codes = ngram_codes(idx[:MAX_SCAN], max_size)
+    instrument.count('ngrams_scanned', len(codes))
+    bits = max(len(codes) - 1, 1).bit_length()
+    if 26 ** max_size << bits < 1 << 63:
+        # sort (code, position) packed into one int64: a plain sort is
+        # about twice as fast as argsort
+        packed = (codes << bits) | np.arange(len(codes))
+        packed.sort()
+        order, codes = packed & ((1 << bits) - 1), packed >> bits
+    else:
+        order = np.argsort(codes)
+        codes = codes[order]
+    spacing = np.abs(np.diff(order))
+    for size in range(min_size, max_size + 1):
+        prefix = codes // 26 ** (max_size - size)
+        yield size, spacing[(prefix[1:] == prefix[:-1]) & (spacing <= MAX_SPACING)]
+
+
+def factor_histogram(spacings, max_length=MAX_LENGTH, hist=None):
+    """Add to hist[L] the number of spacings divisible by L, for L up to max_length."""
+    if hist is None:
+        hist = np.zeros(max_length + 1)
+    if len(spacings) * max_length < spacings.max(initial=0):
+        # few spacings (a small chunk of a stream): test them per length
+        # rather than count every spacing value up to the largest
+        for length in range(1, max_length + 1):
+            hist[length] += np.count_nonzero(spacings % length == 0)
+    else:
+        counts = np.bincount(spacings, minlength=max_length + 1)
+        for length in range(1, max_length + 1):
+            hist[length] += counts[length::length].sum()
+    hist[0] += len(spacings)
+    return hist
+
+
+def key_lengths(idx, min_size=3, max_size=5, max_length=MAX_LENGTH):
+    """Key length candidates ranked by score, as (length, score) pairs.
+
+    Longer repeats are counted once per size they reach, so they weigh
+    more. A length scores the spacings it divides beyond the 1/L share
+    expected by chance; this peaks at the key length rather than its
+    divisors, which divide every true spacing too.
+    """
+    hist = None
+    for size, spacings in repeat_spacings(idx, min_size, max_size):
+        hist = factor_histogram(spacings, max_length, hist)
+    return rank_lengths(hist)
+
+
+def rank_lengths(hist):
+    """key_lengths() from a factor histogram of all spacings."""
+    if hist is None or not hist[0]:
+        return []
+    max_length = len(hist) - 1
+    lengths = np.arange(2, max_length + 1)
+    instrument.count('key_lengths_evaluated', len(lengths))
+    scores = hist[2:] - hist[0] / lengths
+    ranked = np.argsort(-scores, kind='mergesort')
+    return [(int(lengths[i]), float(scores[i])) for i in ranked]
@@ -0,0 +1,329 @@
+"""Local Vigenere service: line-delimited JSON over a Unix socket.
+
+One process keeps the cipher tables and the language profile loaded, so
+a request costs the cipher work rather than an interpreter start. Each
+line sent is one request and gets one response line, in order:
+
+    {"id": 1, "op": "encrypt", "key": "LEMON", "text": "attack at dawn"}
+    {"id": 1, "result": "LXFOPVEFRNHR"}
+
+Ops are encrypt and decrypt ("preserve": true keeps case and
+punctuation), crack ("climb": restarts to hill-climb the key) and stats
+("format": "prometheus" for text exposition). Encrypt, decrypt and crack
+take "variant": "beaufort", "variant" or "autokey" (see vigenere.py).
+Failures come back as {"id": ..., "error": "..."}.
+
+The server runs on one asyncio event loop. Encrypt and decrypt requests
+go to a single batching task: whatever has queued up while it worked on
+the last batch is grouped by key and keyed in one vigenere.shift_many()
+call, on an executor thread so the loop goes on reading requests.
+Cracks run in a process pool (run_in_executor); their results are
+cached by ciphertext in the server (see cache.py). A connection has at
+most MAX_INFLIGHT requests outstanding and the server at most
+MAX_CRACKS cracks; past either limit it stops reading that connection
+until replies drain. Per-op latencies are kept as histograms (see
+instrument.observe).
+
+The service is meant for localhost only: it listens on a Unix socket,
+or with --port on 127.0.0.1.
+
+    python server.py -s /tmp/vigenere.sock -l english
+"""
+
+import sys, os, json, time, signal, socket, asyncio, argparse, threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count, get_context
+import alphabet, analysis, batch, cache, instrument, language, solver, vigenere
+
+MAX_INFLIGHT = 256  # outstanding requests per connection
+MAX_CRACKS = 64     # cracks queued or running, all connections
+MAX_BATCH = 1024    # requests keyed in one batch
+MAX_LINE = 1 << 26  # longest request line, bytes
+
+
+def crack(cipher, climb=0, variant=vigenere.VIGENERE):
+    """Pool worker: batch.crack_one, optionally refined by hill-climbing
+    (periodic variants only). Returns the result record; errors are
+    returned rather than raised."""
+    try:
+        result = batch.crack_one((None, cipher), variant)
+        del result['id']
+        if climb and 'key' in result and variant in vigenere.PERIODIC:
+            view, negate = analysis.vigenere_view(analysis.encode(cipher), variant)
+            key, fitness = solver.solve(view, len(result['key']),
+                                        batch._profile, climb)
+            result.update(key=analysis.decode(analysis.NEGATE[key] if negate else key),
+                          fitness=float(fitness))
+        return result
+    except Exception as e:
+        return {'error': repr(e)}
+
+
+def setup(*args):
+    """Pool initializer: batch._setup, with Ctrl-C left to the server,
+    which shuts the pool down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    batch._setup(*args)
+
+
+def string(request, name):
+    """A string field of a request; null, numbers and the like are a
+    ValueError rather than being turned into text."""
+    value = request[name]
+    if not isinstance(value, str):
+        raise ValueError("%s must be a string" % name)
+    return value
+
+
+def variant(request):
+    """Cipher variant named by a request; unknown names are a ValueError."""
+    name = str(request.get('variant', vigenere.VIGENERE))
+    if name not in vigenere.VARIANTS:
+        raise ValueError("unknown variant: %s" % name)
+    return name
+
+
+class Reply(object):
+    """Response to one request, a future on the event loop."""
+
+    def __init__(self, ident, op=None):
+        self.id, self.op = ident, op
+        self.start = time.time()
+        self.future = asyncio.get_running_loop().create_future()
+
+    def set(self, **response):
+        if self.future.done():
+            return
+        response['id'] = self.id
+        if self.op:
+            instrument.observe(self.op, time.time() - self.start)
+        self.future.set_result(response)
+
+    async def get(self):
+        return await self.future
+
+
+def flush(jobs):
+    """Key a batch of encrypt/decrypt jobs, one call per key and variant;
+    returns (reply, response) pairs. Runs off the event loop, so it only
+    computes the responses and the loop sets them."""
+    instrument.count('batches')
+    instrument.count('batched_requests', len(jobs))
+    groups = {}
+    for job in jobs:
+        reply, key, text, decrypt, keep_format, variant = job
+        groups.setdefault((key, decrypt, variant), []).append(job)
+    out = []
+    for (key, decrypt, variant), group in groups.items():
+        # any failure is answered, so that no client waits on the group
+        try:
+            letters = vigenere.shift_many(key, [job[2] for job in group], decrypt, variant)
+            out.extend((job[0], {'result': alphabet.restore(l, job[2]) if job[4] else l.decode('ascii')})
+                       for job, l in zip(group, letters))
+        except ValueError as e:
+            out.extend((job[0], {'error': str(e)}) for job in group)
+        except Exception as e:
+            out.extend((job[0], {'error': repr(e)}) for job in group)
+    return out
+
+
+class Service(object):
+    """Request dispatch of one server, on its event loop."""
+
+    def __init__(self, workers=None, profile=None):
+        self.workers = workers or cpu_count()
+        self.profile = profile or language.load('english')
+
+    async def start(self, address):
+        """Listen on a socket path or a (host, port) pair; returns self."""
+        self.loop = asyncio.get_running_loop()
+        # build every shifted alphabet now rather than on first use
+        vigenere.tables(alphabet.LETTERS)
+        vigenere.tables(alphabet.LETTERS, variant=vigenere.BEAUFORT)
+        # workers are forked from a clean server process, not from this
+        # threaded one, and load the profile and cache themselves
+        self.pool = ProcessPoolExecutor(self.workers, get_context('forkserver'), setup,
+                                        (self.profile.name, vigenere.VIGENERE, cache.default.path))
+        self.cracks = asyncio.Semaphore(MAX_CRACKS)
+        self.queue = asyncio.Queue()
+        self.tasks = set()
+        self.batcher = asyncio.ensure_future(self.batch())
+        if isinstance(address, tuple):
+            self.server = await asyncio.start_server(self.handle, *address, limit=MAX_LINE)
+        else:
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = await asyncio.start_unix_server(self.handle, address, limit=MAX_LINE)
+        self.address = self.server.sockets[0].getsockname()
+        return self
+
+    async def batch(self):
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < MAX_BATCH and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+            for reply, response in await self.loop.run_in_executor(None, flush, jobs):
+                reply.set(**response)
+
+    async def handle(self, reader, writer):
+        """One connection: requests are read as fast as the in-flight limit
+        allows and a sender task writes the replies back in order."""
+        pending = asyncio.Queue(MAX_INFLIGHT)
+        sender = asyncio.ensure_future(self.send(pending, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await pending.put(await self.submit(line))
+        except ValueError:
+            reply = Reply(None)
+            reply.set(error='bad request: longer than %d bytes' % MAX_LINE)
+            await pending.put(reply)
+        except ConnectionError:
+            pass
+        await pending.put(None)
+        await sender
+        writer.close()
+
+    async def send(self, pending, writer):
+        broken = False
+        while True:
+            reply = await pending.get()
+            if reply is None:
+                break
+            response = await reply.get()
+            if broken:
+                continue    # client went away; its remaining replies are dropped
+            try:
+                writer.write((json.dumps(response) + '\n').encode('utf-8'))
+                await writer.drain()
+            except ConnectionError:
+                broken = True
+
+    async def submit(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            reply = Reply(None)
+            reply.set(error='bad request: %s' % e)
+            return reply
+        op = request.get('op')
+        reply = Reply(request.get('id'), op)
+        try:
+            if op in ('encrypt', 'decrypt'):
+                self.queue.put_nowait((reply, string(request, 'key'), string(request, 'text'),
+                                       op == 'decrypt', request.get('preserve', False),
+                                       variant(request)))
+            elif op == 'crack':
+                await self.crack(reply, string(request, 'text'), int(request.get('climb', 0)), variant(request))
+            elif op == 'stats':
+                if request.get('format') == 'prometheus':
+                    reply.set(result=instrument.prometheus())
+                else:
+                    report = instrument.report()
+                    report['cache'] = cache.default.stats()
+                    reply.set(result=report)
+            else:
+                reply.set(error='unknown op: %r' % op)
+        except (KeyError, AttributeError, TypeError, ValueError) as e:
+            reply.set(error='bad request: %r' % e)
+        return reply
+
+    async def crack(self, reply, text, climb, variant=vigenere.VIGENERE):
+        key = cache.default.key('server_crack', alphabet.encode(text), [climb, variant, self.profile.name])
+        result = cache.default.get(key)
+        if result is not None:
+            return reply.set(result=result)
+        # past MAX_CRACKS this holds up reading the connection
+        await self.cracks.acquire()
+        task = asyncio.ensure_future(self.run_crack(reply, key, text, climb, variant))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_crack(self, reply, key, text, climb, variant):
+        try:
+            result = await self.loop.run_in_executor(self.pool, crack, text, climb, variant)
+        except Exception as e:
+            # the worker died or its result could not be sent back
+            return reply.set(error=repr(e))
+        finally:
+            self.cracks.release()
+        error = result.pop('error', None)
+        if error:
+            reply.set(error=error)
+        else:
+            cache.default.put(key, result)
+            reply.set(result=result)
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def shutdown(self):
+        """Stop a service started by serve(), from any other thread."""
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def serve(address, workers=None, profile=None):
+    """Service listening on a socket path or a (host, port) pair, its event
+    loop running in a background thread; shutdown() stops it."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+    return asyncio.run_coroutine_threadsafe(Service(workers, profile).start(address), loop).result()
+
+
+async def run(address, workers=None, profile=None):
+    service = await Service(workers, profile).start(address)
+    sys.stderr.write('listening on %s\n' % (address,))
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+def request(address, *requests):
+    """Client: send requests (dicts) over one connection, return the replies."""
+    if isinstance(address, tuple):
+        sock = socket.create_connection(address)
+    else:
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(address)
+    try:
+        sock.sendall(''.join(json.dumps(r) + '\n' for r in requests).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        f = sock.makefile('rb')
+        return [json.loads(line) for line in f]
+    finally:
+        sock.close()
+
+
+def main(argv):
+    description = "Vigenere service"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-s', metavar='socket', default='/tmp/vigenere.sock', help='Unix socket path to listen on')
+    parser.add_argument('--port', type=int, help='listen on 127.0.0.1:PORT instead of a Unix socket')
+    parser.add_argument('--workers', metavar='N', type=int, default=None, help='crack worker processes (default: one per core)')
+    parser.add_argument('-l', metavar='lang', default='english', help='language profile to score against')
+    parser.add_argument('--cache', metavar='db', help='keep crack results in this SQLite file across restarts')
+    args = parser.parse_args(argv)
+
+    instrument.enable()
+    if args.cache:
+        cache.default = cache.Cache(path=args.cache)
+    address = ('127.0.0.1', args.port) if args.port else args.s
+    try:
+        asyncio.run(run(address, args.workers, language.load(args.l)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
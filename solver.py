@@ -0,0 +1,104 @@
+"""Quadgram hill-climbing solver for short Vigenere ciphertexts.
+
+Column statistics are too noisy to pick key letters on their own when a
+message is only a few hundred letters long. The solver starts from the
+frequency-analysis key and changes one key letter at a time while the
+quadgram log-likelihood of the decryption improves, with random restarts.
+
+Quadgrams are grouped by the key phase they start at. A key letter only
+touches the (at most four) groups whose quadgrams cover its column, so
+all 26 values of one letter are scored by re-scoring those groups only.
+"""
+
+import numpy as np
+import analysis, instrument, language
+
+WEIGHTS = np.array([26 ** 3, 26 ** 2, 26, 1])
+_ALL = np.arange(26)
+
+
+class Climber(object):
+    """Incremental quadgram fitness of decryptions of one ciphertext."""
+
+    def __init__(self, idx, key_length, profile):
+        self.length = key_length
+        self.table = np.asarray(profile.tables[4], dtype=np.float64)
+        idx = np.asarray(idx, dtype=np.int64)
+        starts = np.arange(max(len(idx) - 3, 0))
+        # ciphertext letters of every quadgram, one (4, n) block per start phase
+        self.blocks = [idx[starts[r::key_length] + np.arange(4)[:, None]]
+                       for r in range(key_length)]
+        # key column of each of the four letters, per start phase
+        self.columns = [(r + np.arange(4)) % key_length for r in range(key_length)]
+        # start phases whose quadgrams cover each column
+        self.touching = [sorted(set((j - t) % key_length for t in range(4)))
+                         for j in range(key_length)]
+        # code contribution of column j's letters in phase r for all 26 key
+        # values; it does not depend on the rest of the key
+        self.varied, self.fixed = {}, {}
+        for j in range(key_length):
+            for r in self.touching[j]:
+                hit = self.columns[r] == j
+                plain = (self.blocks[r][hit][None] - _ALL[:, None, None]) % 26
+                self.varied[j, r] = np.einsum('t,vtn->vn', WEIGHTS[hit], plain)
+                self.fixed[j, r] = self.blocks[r][~hit], self.columns[r][~hit], WEIGHTS[~hit]
+
+    def phase_score(self, key, r):
+        plain = (self.blocks[r] - key[self.columns[r]][:, None]) % 26
+        return self.table[WEIGHTS.dot(plain)].sum()
+
+    def scores(self, key):
+        """Per-phase scores of a key; their sum is the fitness."""
+        return np.array([self.phase_score(key, r) for r in range(self.length)])
+
+    def column(self, key, j):
+        """Fitness of the touched phases for every value of key[j], as (26, phases)."""
+        instrument.count('keys_evaluated', 26)
+        out = np.empty((26, len(self.touching[j])))
+        for n, r in enumerate(self.touching[j]):
+            block, columns, weights = self.fixed[j, r]
+            codes = weights.dot((block - key[columns][:, None]) % 26)
+            out[:, n] = self.table[self.varied[j, r] + codes].sum(axis=1)
+        return out
+
+    def climb(self, key, dirty=None):
+        """Best single-letter changes until none helps; returns (key, fitness).
+
+        Only columns in ``dirty`` (default: all) and the neighbours of
+        changed letters are re-examined.
+        """
+        key = np.array(key, dtype=np.int64)
+        scores = self.scores(key)
+        dirty = set(range(self.length) if dirty is None else dirty)
+        while dirty:
+            j = min(dirty)
+            dirty.discard(j)
+            touched = self.touching[j]
+            table = self.column(key, j)
+            v = table.sum(axis=1).argmax()
+            if table[v].sum() > scores[touched].sum() + 1e-9:
+                key[j] = v
+                scores[touched] = table[v]
+                dirty.update((j + d) % self.length for d in range(-3, 4) if d)
+        return key, scores.sum()
+
+
+def solve(idx, key_length, profile=None, restarts=200, seed=None):
+    """Key indices and fitness found by hill-climbing with restarts.
+
+    The first climb starts from the frequency-analysis key; each restart
+    re-randomizes a third of the best key's letters.
+    """
+    profile = profile or language.load('english')
+    climber = Climber(idx, key_length, profile)
+    start, _ = analysis.crack(idx, key_length, profile.freq, profile.coincidence)
+    best, best_score = climber.climb(start)
+    rng = np.random.RandomState(seed)
+    for _ in range(restarts):
+        key = best.copy()
+        cols = rng.choice(key_length, max(1, key_length // 3), replace=False)
+        key[cols] = rng.randint(0, 26, len(cols))
+        key, score = climber.climb(key, set((c + d) % key_length for c in cols for d in range(-3, 4)))
+        if score > best_score:
+            best, best_score = key, score
+    return best, best_score
@@ -0,0 +1,43 @@
+"""cache.Cache: LRU order, and the same values from memory and disk."""
+
+import numpy as np
+import cache
+
+
+def test_memory_and_disk_hits_agree(tmp_path):
+    path = str(tmp_path / 'results.db')
+    value = [('LEMON', 0.064), {'key': 'LEMON', 'lengths': (5, 10)}]
+    first = cache.Cache(path=path)
+    stored = first.put('k', value)
+    assert first.get('k') == stored
+    assert stored == [['LEMON', 0.064], {'key': 'LEMON', 'lengths': [5, 10]}]
+
+    second = cache.Cache(path=path)
+    assert second.get('k') == stored
+    assert second.disk_hits == 1
+    assert second.get('k') == stored
+    assert second.disk_hits == 1
+
+
+def test_memo_computes_once():
+    c = cache.Cache()
+    calls = []
+    letters = np.arange(26, dtype=np.uint8)
+    for _ in range(3):
+        value = c.memo('test', letters, [1, 2], lambda: calls.append(1) or (1, 'A'))
+    assert value == [1, 'A']
+    assert len(calls) == 1
+    assert c.memo('test', letters, [1, 3], lambda: 2) == 2
+    assert c.memo('test', letters[::-1].copy(), [1, 2], lambda: 3) == 3
+
+
+def test_least_recently_used_is_evicted():
+    c = cache.Cache(size=2)
+    c.put('a', 1)
+    c.put('b', 2)
+    c.get('a')
+    c.put('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1
+    assert c.get('c') == 3
+    assert c.stats()['evictions'] == 1
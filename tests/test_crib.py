@@ -0,0 +1,30 @@
+"""crib: keys recovered from a known word anywhere in the text."""
+
+import os
+import pytest
+import alphabet, analysis, crib, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    PLAIN = alphabet.clean(f.read())[:2000]
+
+
+@pytest.mark.parametrize('variant', vigenere.PERIODIC)
+@pytest.mark.parametrize('offset', [0, 101, 1234])
+def test_finds_the_key_at_any_offset(variant, offset):
+    idx = analysis.encode(vigenere.vce('LEMONADE', PLAIN, variant))
+    hits = crib.search(idx, PLAIN[offset:offset + 24], variant=variant)
+    assert (offset, 8, 'LEMONADE') in [h[:3] for h in hits]
+    assert hits[0][2] == 'LEMONADE'
+
+
+def test_first_stops_at_the_first_block(monkeypatch):
+    monkeypatch.setattr(crib, 'CHUNK', 100)
+    idx = analysis.encode(vigenere.vce('LEMONADE', PLAIN))
+    hits = crib.search(idx, PLAIN[150:174], first=True)
+    assert [h[:3] for h in hits] == [(150, 8, 'LEMONADE')]
+
+
+def test_no_hit_for_a_crib_longer_than_the_text():
+    assert crib.search(analysis.encode('ABCDEF'), 'ABCDEFGHIJ') == []
@@ -0,0 +1,32 @@
+"""dictionary: wordlist parsing and the ranked key attack."""
+
+import os
+import pytest
+import analysis, dictionary, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = b'lemon\nMoby Dick\napple\norange\nwhale\nIshmael\nLemonade\nLEMON\n\n'
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    TEXT = f.read()
+
+
+def test_keys():
+    keys = dictionary.keys(WORDS)
+    assert sorted(keys) == [5, 6, 7, 8]
+    assert [analysis.decode(k) for k in keys[5]] == ['APPLE', 'LEMON', 'WHALE']
+    assert [analysis.decode(k) for k in keys[8]] == ['LEMONADE', 'MOBYDICK']
+    assert dictionary.keys(b'abc\n' + b'x' * 70, max_key=64).keys() == {3}
+
+
+@pytest.mark.parametrize('variant', vigenere.PERIODIC)
+def test_attack_ranks_the_key_first(variant):
+    idx = analysis.encode(vigenere.vce('LEMONADE', TEXT, variant)[:2000])
+    ranked = dictionary.attack(idx, WORDS, variant=variant)
+    assert ranked[0][0] == 'LEMONADE'
+    assert len(ranked) == 7
+
+
+def test_attack_with_workers():
+    idx = analysis.encode(vigenere.vce('WHALE', TEXT)[:2000])
+    assert dictionary.attack(idx, WORDS, workers=2)[0][0] == 'WHALE'
@@ -0,0 +1,27 @@
+"""keylength: ranked key lengths and the autokey primer search."""
+
+import os
+import analysis, keylength, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    TEXT = f.read()
+
+
+def test_candidates_rank_the_key_length_first():
+    idx = analysis.encode(vigenere.vce('LEMONADE', TEXT)[:3000])
+    ranked = keylength.candidates(idx)
+    assert ranked[0][0] == 8
+    assert keylength.shortlist(ranked)[0] == 8
+
+
+def test_autokey_key():
+    idx = analysis.encode(vigenere.vce('LEMON', TEXT, vigenere.AUTOKEY)[:3000])
+    key, fit = keylength.autokey_key(idx)
+    assert analysis.decode(key) == 'LEMON'
+
+
+def test_autokey_key_needs_a_column_of_letters():
+    idx = analysis.encode(vigenere.vce('LEMON', TEXT, vigenere.AUTOKEY)[:keylength.MIN_COLUMN - 1])
+    assert keylength.autokey_key(idx) == (None, None)
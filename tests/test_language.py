@@ -0,0 +1,51 @@
+"""language: profiles built, saved and loaded back."""
+
+import os
+import numpy as np
+import pytest
+import analysis, language
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTICLE = os.path.join(HERE, 'article.txt')
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    monkeypatch.setattr(language, '_cache', {})
+
+
+def test_build():
+    profile = language.build('test', [ARTICLE])
+    for order in language.ORDERS:
+        assert profile.tables[order].dtype == np.float32
+        assert profile.tables[order].shape == (26 ** order,)
+    assert abs(profile.freq.sum() - 1) < 1e-9
+    assert profile.freq.argmax() == analysis.encode('E')[0]
+    assert .06 < profile.coincidence < .075
+
+
+def test_save_and_load(tmp_path, fresh):
+    built = language.build('test', [ARTICLE])
+    language.save(built, str(tmp_path))
+    language.save(built, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == ['test']
+    loaded = language.load('test', str(tmp_path))
+    for order in language.ORDERS:
+        assert loaded.tables[order].dtype == np.float32
+        assert np.array_equal(loaded.tables[order], built.tables[order])
+    idx = analysis.encode('THEQUICKBROWNFOX')
+    assert loaded.score(idx) == built.score(idx)
+
+
+def test_incomplete_profile_is_rebuilt(tmp_path, fresh):
+    saved = tmp_path / 'english'
+    saved.mkdir()
+    np.save(str(saved / '1.npy'), np.zeros(26, dtype=np.float32))
+    profile = language.load('english', str(tmp_path))
+    assert profile.tables[1].max() < 0
+    assert sorted(os.listdir(str(saved))) == ['%d.npy' % order for order in language.ORDERS]
+
+
+def test_unknown_profile(tmp_path, fresh):
+    with pytest.raises(ValueError):
+        language.load('klingon', str(tmp_path))
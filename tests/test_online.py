@@ -0,0 +1,33 @@
+"""online.Analyser: feeding a text in pieces gives the counts of one update."""
+
+import os
+import numpy as np
+import pytest
+import analysis, online, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    CIPHER = analysis.encode(vigenere.shift('LEMONADE', f.read())[:3000])
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+def test_chunks_match_one_update(size):
+    cipher = CIPHER[:1500]
+    whole = online.Analyser(max_length=20)
+    whole.update(cipher)
+    pieces = online.Analyser(max_length=20)
+    for start in range(0, len(cipher), size):
+        pieces.update(cipher[start:start + size])
+    assert pieces.letters == whole.letters
+    assert np.array_equal(pieces.factors, whole.factors)
+    for a, b in zip(pieces.columns, whole.columns):
+        assert np.array_equal(a, b)
+
+
+def test_finds_the_key():
+    analyser = online.Analyser()
+    for start in range(0, len(CIPHER), 500):
+        estimate = analyser.update(CIPHER[start:start + 500])
+    assert estimate['key'] == 'LEMONADE'
+    assert estimate['key_lengths'][0][0] == 8
@@ -0,0 +1,51 @@
+"""repeats: the sort-based repeat finder against a brute-force count."""
+
+import os
+from collections import defaultdict
+import numpy as np
+import pytest
+import analysis, repeats, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    IDX = analysis.encode(vigenere.vce('LEMON', f.read())[:2000])
+
+
+def brute_spacings(idx, size):
+    seen = defaultdict(list)
+    for i in range(len(idx) - size + 1):
+        seen[tuple(idx[i:i + size])].append(i)
+    return sorted(b - a for at in seen.values() for a, b in zip(at, at[1:]))
+
+
+def test_ngram_codes():
+    codes = repeats.ngram_codes(analysis.encode('ABCZ'), 2)
+    assert codes.tolist() == [1, 26 + 2, 2 * 26 + 25]
+
+
+@pytest.mark.parametrize('size', [3, 4, 5])
+def test_repeat_spacings_match_brute_force(size):
+    (found, spacings), = repeats.repeat_spacings(IDX, size, size)
+    assert found == size
+    assert sorted(spacings.tolist()) == brute_spacings(IDX, size)
+
+
+def test_repeat_spacings_count_every_size():
+    for size, spacings in repeats.repeat_spacings(IDX, 3, 5):
+        # the last n-grams of a size shorter than the longest are not coded
+        expected = brute_spacings(IDX[:len(IDX) - 5 + size], size)
+        assert len(spacings) == len(expected)
+
+
+@pytest.mark.parametrize('spacings', [[6, 12, 35, 40, 10 ** 6], list(range(1, 200))])
+def test_factor_histogram_match_brute_force(spacings):
+    hist = repeats.factor_histogram(np.array(spacings), 20)
+    assert hist[0] == len(spacings)
+    for length in range(1, 21):
+        assert hist[length] == sum(1 for s in spacings if s % length == 0)
+
+
+def test_key_lengths():
+    assert repeats.key_lengths(IDX)[0][0] == 5
+    assert repeats.key_lengths(IDX[:3]) == []
@@ -0,0 +1,81 @@
+"""Request/response round trips against a server on localhost."""
+
+import os
+import pytest
+import server, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt')) as f:
+    TEXT = f.read()
+
+
+@pytest.fixture(scope='module')
+def address():
+    srv = server.serve(('127.0.0.1', 0), workers=1)
+    yield srv.address
+    srv.shutdown()
+
+
+def test_encrypt_decrypt(address):
+    replies = server.request(address,
+        {'id': 1, 'op': 'encrypt', 'key': 'LEMON', 'text': 'attack at dawn'},
+        {'id': 2, 'op': 'decrypt', 'key': 'LEMON', 'text': 'LXFOPVEFRNHR'},
+        {'id': 3, 'op': 'encrypt', 'key': 'LEMON', 'text': 'Attack at dawn!', 'preserve': True},
+        {'id': 4, 'op': 'decrypt', 'key': 'LEMON', 'text': 'Lxfopv ef rnhr!', 'preserve': True})
+    assert replies == [{'id': 1, 'result': 'LXFOPVEFRNHR'},
+                       {'id': 2, 'result': 'ATTACKATDAWN'},
+                       {'id': 3, 'result': 'Lxfopv ef rnhr!'},
+                       {'id': 4, 'result': 'Attack at dawn!'}]
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_variants(address, variant):
+    cipher = vigenere.vce('LEMON', TEXT[:500], variant)
+    replies = server.request(address,
+        {'id': 1, 'op': 'encrypt', 'key': 'LEMON', 'text': TEXT[:500], 'variant': variant},
+        {'id': 2, 'op': 'decrypt', 'key': 'LEMON', 'text': cipher, 'variant': variant})
+    assert [r['result'] for r in replies] == [cipher, vigenere.vcd('LEMON', cipher, variant)]
+
+
+def test_replies_in_order(address):
+    requests = [{'id': i, 'op': 'encrypt', 'key': 'KEY%d' % (i % 3), 'text': 'hello %d' % i}
+                for i in range(500)]
+    replies = server.request(address, *requests)
+    assert [r['id'] for r in replies] == list(range(500))
+    assert [r['result'] for r in replies] == [vigenere.vce(r['key'], r['text']) for r in requests]
+
+
+def test_crack(address):
+    cipher = vigenere.vce('LEMONADE', TEXT[:4000])
+    reply, again = server.request(address, {'id': 1, 'op': 'crack', 'text': cipher},
+                                  {'id': 2, 'op': 'crack', 'text': cipher.lower()})
+    assert reply['result']['key'] == 'LEMONADE'
+    assert again['result']['key'] == 'LEMONADE'
+
+
+def test_errors(address):
+    replies = server.request(address,
+        {'id': 1, 'op': 'encrypt', 'key': '', 'text': 'x'},
+        {'id': 2, 'op': 'encrypt', 'key': 'LEMON', 'text': None},
+        {'id': 3, 'op': 'crack', 'text': 42},
+        {'id': 4, 'op': 'encrypt', 'key': 'LEMON', 'text': 'x', 'variant': 'caesar'},
+        {'id': 5, 'op': 'nope'},
+        {'id': 6, 'op': 'encrypt'})
+    assert [r['id'] for r in replies] == list(range(1, 7))
+    assert all('error' in r and 'result' not in r for r in replies)
+
+
+def test_stats(address):
+    reply, = server.request(address, {'id': 1, 'op': 'stats'})
+    assert 'cache' in reply['result']
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'vigenere.sock')
+    srv = server.serve(path, workers=1)
+    try:
+        assert server.request(path, {'id': 1, 'op': 'encrypt', 'key': 'LEMON', 'text': 'attack at dawn'}) == \
+            [{'id': 1, 'result': 'LXFOPVEFRNHR'}]
+    finally:
+        srv.shutdown()
@@ -0,0 +1,25 @@
+"""solver: hill-climbing recovers keys too long for their columns."""
+
+import os
+import alphabet, analysis, language, solver, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    PLAIN = alphabet.clean(f.read())
+
+
+def test_solves_a_short_ciphertext():
+    idx = analysis.encode(vigenere.vce('LEMONADE', PLAIN[:240]))
+    key, fitness = solver.solve(idx, 8, restarts=50, seed=1)
+    assert analysis.decode(key) == 'LEMONADE'
+    plain = analysis.encode(PLAIN[:240])
+    assert abs(fitness - language.load('english').score(plain)) < 1e-3
+
+
+def test_seed_repeats():
+    idx = analysis.encode(vigenere.vce('LEMONADE', PLAIN[:120]))
+    first = solver.solve(idx, 8, restarts=20, seed=3)
+    again = solver.solve(idx, 8, restarts=20, seed=3)
+    assert analysis.decode(first[0]) == analysis.decode(again[0])
+    assert first[1] == again[1]
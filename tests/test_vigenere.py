@@ -0,0 +1,90 @@
+"""Round trips of the cipher engine: every variant, serial and parallel
+streaming, and --preserve."""
+
+import io, os
+import pytest
+import alphabet, vigenere
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KEY = 'Lemon Curry'
+
+with open(os.path.join(HERE, 'article.txt'), 'rb') as f:
+    TEXT = f.read()
+
+
+def run(fn, data, *args, **kwargs):
+    out = io.BytesIO()
+    fn(KEY, io.BytesIO(data), out, *args, **kwargs)
+    return out.getvalue()
+
+
+def test_known_values():
+    assert vigenere.vce('MATH', 'MAKEITHAPPEN') == 'YADLUTAHBPXU'
+    assert vigenere.vcd('MATH', 'YADLUTAHBPXU') == 'MAKEITHAPPEN'
+    assert vigenere.vce('LEMON', 'attack at dawn') == 'LXFOPVEFRNHR'
+    assert vigenere.vce('LEMON', 'ATTACKATDAWN', vigenere.BEAUFORT) == 'LLTOLBETLNPR'
+    assert vigenere.vce('LEMON', 'ATTACKATDAWN', vigenere.VARIANT) == 'PPHMPZWHPNLJ'
+    assert vigenere.vce('LEMON', 'ATTACKATDAWN', vigenere.AUTOKEY) == 'LXFOPKTMDCGN'
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_round_trip(variant):
+    cipher = vigenere.vce(KEY, TEXT, variant)
+    assert cipher != alphabet.clean(TEXT)
+    assert vigenere.vcd(KEY, cipher, variant) == alphabet.clean(TEXT)
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_pieces_keep_the_key_state(variant):
+    codes = alphabet.encode(TEXT)
+    step = vigenere.keyer(KEY, variant=variant)
+    pieces = b''.join(step(codes[i:i + 1000]) for i in range(0, len(codes), 1000))
+    assert pieces == vigenere.shift(KEY, TEXT, variant=variant)
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_shift_many(variant):
+    texts = [TEXT[:100], b'', b'a', TEXT[500:777]]
+    assert vigenere.shift_many(KEY, texts, variant=variant) == \
+        [vigenere.shift(KEY, t, variant=variant) for t in texts]
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_stream(variant):
+    cipher = run(vigenere.stream, TEXT, chunk_size=997, variant=variant)
+    assert cipher.replace(b'\n', b'') == vigenere.shift(KEY, TEXT, variant=variant)
+    # newlines are copied through, so the lines survive the round trip
+    plain = run(vigenere.stream, cipher, True, chunk_size=1009, variant=variant)
+    assert plain == TEXT.translate(alphabet.UPPER, alphabet.NONLETTERS.replace(b'\n', b''))
+
+
+@pytest.mark.parametrize('variant', vigenere.VARIANTS)
+def test_stream_preserve(variant):
+    cipher = run(vigenere.stream, TEXT, chunk_size=997, keep_format=True, variant=variant)
+    assert len(cipher) == len(TEXT)
+    assert alphabet.encode(cipher) == alphabet.encode(vigenere.shift(KEY, TEXT, variant=variant))
+    assert run(vigenere.stream, cipher, True, chunk_size=1009, keep_format=True, variant=variant) == TEXT
+
+
+@pytest.mark.parametrize('keep_format', [False, True])
+@pytest.mark.parametrize('variant', vigenere.PERIODIC)
+def test_parallel_stream(variant, keep_format):
+    serial = run(vigenere.stream, TEXT, chunk_size=997, keep_format=keep_format, variant=variant)
+    parallel = run(vigenere.parallel_stream, TEXT, chunk_size=997, workers=2,
+                   keep_format=keep_format, variant=variant)
+    assert parallel == serial
+    plain = run(vigenere.parallel_stream, parallel, True, chunk_size=1009, workers=2,
+                keep_format=keep_format, variant=variant)
+    assert plain == run(vigenere.stream, serial, True, keep_format=keep_format, variant=variant)
+
+
+def test_parallel_autokey_is_refused():
+    with pytest.raises(ValueError):
+        run(vigenere.parallel_stream, TEXT, workers=2, variant=vigenere.AUTOKEY)
+
+
+def test_empty_key():
+    with pytest.raises(ValueError):
+        vigenere.vce('', 'text')
+    with pytest.raises(ValueError):
+        vigenere.vce('123', 'text', vigenere.AUTOKEY)
@@ -1,32 +1,235 @@
+"""Polyalphabetic cipher engine: Vigenere and its Beaufort and autokey
+variants over normalized letter indices (see alphabet.py).
+
+With P, C and K the plaintext, ciphertext and key letters (0..25):
+
+- vigenere: C = P + K
+- beaufort: C = K - P (its own inverse)
+- variant (variant Beaufort): C = P - K
+- autokey: C = P + K, where the key is followed by the plaintext itself
+
+The periodic variants key each phase of the text with one translate table.
+Autokey decryption looks sequential, as every plaintext letter keys a
+later one, but within one key phase the letters are an alternating sum:
+P[t] = C[t] - C[t-1] + C[t-2] ... -/+ K, counting t along the phase, so a
+whole text is decrypted by one NumPy cumulative sum over all phases.
+"""
+
 import sys, argparse
+import alphabet
+
+VIGENERE, BEAUFORT, VARIANT, AUTOKEY = VARIANTS = ('vigenere', 'beaufort', 'variant', 'autokey')
+PERIODIC = VARIANTS[:3]
+
+_tables = {}
+
+def _table(shift, sign=1):
+    """Translation table taking letter index b to the letter chr(65 + (sign * b + shift) % 26)."""
+    if (shift, sign) not in _tables:
+        _tables[shift, sign] = bytes(65 + (sign * b + shift) % 26 for b in range(256))
+    return _tables[shift, sign]
+
+def tables(k, decrypt=False, variant=VIGENERE):
+    """Cipher alphabets for each letter of a periodic variant's key; at
+    most 52 are ever built."""
+    if variant == BEAUFORT:
+        return [_table(ki, -1) for ki in alphabet.encode(k)]
+    sign = -1 if decrypt != (variant == VARIANT) else 1
+    return [_table(sign * ki % 26) for ki in alphabet.encode(k)]
+
+def unroll(codes, n):
+    """Autokey ciphertext letters as an alternating running sum per key
+    phase: an (rows, n) int64 array U, the last row padded, such that the
+    plaintext is U[t, j] - K[j] on even rows t and U[t, j] + K[j] on odd
+    ones (mod 26)."""
+    import numpy as np
+    rows = -(-len(codes) // n)
+    grid = np.zeros(rows * n, dtype=np.int64)
+    grid[:len(codes)] = np.frombuffer(codes, dtype=np.uint8)
+    sign = 1 - 2 * (np.arange(rows) % 2)[:, None]
+    return sign * np.cumsum(sign * grid.reshape(rows, n), axis=0) % 26
+
+def autokey_codes(primer, codes, decrypt=False):
+    """Autokey over letter indices, keyed by primer (the key's letter
+    indices); returns letters as bytes and the primer of the text that
+    follows, the last len(primer) plaintext letters."""
+    import numpy as np
+    n = len(primer)
+    if not n:
+        raise ValueError("empty key")
+    key = np.frombuffer(primer, dtype=np.uint8).astype(np.int64)
+    if decrypt:
+        sign = 1 - 2 * (np.arange(-(-len(codes) // n)) % 2)[:, None]
+        plain = ((unroll(codes, n) - sign * key) % 26).ravel()[:len(codes)]
+        out = plain
+    else:
+        plain = np.frombuffer(codes, dtype=np.uint8).astype(np.int64)
+        out = (plain + np.concatenate([key, plain])[:len(plain)]) % 26
+    plain = plain.astype(np.uint8).tobytes()
+    return (out + 65).astype(np.uint8).tobytes(), (primer + plain)[-n:]
+
+def shift_codes(k, codes, decrypt=False, offset=0, variant=VIGENERE):
+    """Apply the key to normalized letter indices (see alphabet.encode) in
+    bulk: one translate per key phase, linear time. Returns letters as bytes.
+
+    ``offset`` is the key position of codes[0], so a long input can be fed
+    in pieces without restarting the key. Autokey has no key phase to
+    resume from: use keyer() to feed it in pieces.
+    """
+    if variant == AUTOKEY:
+        if offset:
+            raise ValueError("autokey cannot start at a key offset")
+        return autokey_codes(alphabet.encode(k), codes, decrypt)[0]
+    if variant not in VARIANTS:
+        raise ValueError("unknown variant: %s" % variant)
+    t = tables(k, decrypt, variant)
+    if not t:
+        raise ValueError("empty key")
+    n = len(t)
+    out = bytearray(len(codes))
+    for j in range(min(n, len(codes))):
+        out[j::n] = codes[j::n].translate(t[(offset + j) % n])
+    return bytes(out)
+
+def keyer(k, decrypt=False, variant=VIGENERE):
+    """A function applying the key to the successive pieces (letter
+    indices) of one text, returning letters; it carries the key phase, or
+    for autokey the running key, from each piece to the next."""
+    offset, primer = 0, alphabet.encode(k)
+    def step(codes):
+        nonlocal offset, primer
+        if variant == AUTOKEY:
+            out, primer = autokey_codes(primer, codes, decrypt)
+        else:
+            out = shift_codes(k, codes, decrypt, offset, variant)
+            offset += len(codes)
+        return out
+    return step
 
-def vce(k,p):
+def shift(k, text, decrypt=False, offset=0, variant=VIGENERE):
+    """Apply the key to the letters of text; anything else is dropped and
+    consumes no key letter."""
+    return shift_codes(k, alphabet.encode(text), decrypt, offset, variant)
+
+def shift_many(k, texts, decrypt=False, variant=VIGENERE):
+    """shift() over many messages, each starting at the first key letter.
+
+    Every message is padded to a whole number of key periods and the lot
+    is keyed as one string, so a batch costs one translate per key phase
+    rather than per message. Autokey messages are keyed one by one.
+    """
+    n = len(alphabet.encode(k))
+    if not n:
+        raise ValueError("empty key")
+    if variant == AUTOKEY:
+        return [shift(k, text, decrypt, variant=variant) for text in texts]
+    codes = [alphabet.encode(text) for text in texts]
+    out = shift_codes(k, b''.join(c + b'\0' * (-len(c) % n) for c in codes), decrypt, 0, variant)
+    result, pos = [], 0
+    for c in codes:
+        result.append(out[pos:pos + len(c)])
+        pos += len(c) + -len(c) % n
+    return result
+
+def vce(k,p,variant=VIGENERE):
     """Vigenere cipher: Cipher_i = (Plain_i + Key_i) mod 26"""
-    
-    from itertools import cycle
-    ki=cycle(k)
-    c=""
-    for pi in p:
-        c = c + chr(65 + ( ( ord(pi) - 65 ) + ( ord( next(ki) ) - 65 ) ) % 26)
-    return c
-
-def vcd(k,c):
+    return shift(k, p, variant=variant).decode('ascii')
+
+def vcd(k,c,variant=VIGENERE):
     """Vigenere Decipher: Plain_i = (Cipher_i - Key_i) mod 26"""
+    return shift(k, c, decrypt=True, variant=variant).decode('ascii')
+
+_NOT_LINES = alphabet.NONLETTERS.replace(b'\n', b'')
+
+def newlines(letters, raw):
+    """letters laid out on the lines of raw: each line of raw is replaced
+    by as many letters as it holds, and the newlines are kept. One
+    translate keeps the letters and newlines of raw; the new letters are
+    written over its letters with a mask, as in alphabet.restore."""
+    if b'\n' not in raw:
+        return letters
+    import numpy as np
+    out = np.frombuffer(raw.translate(None, _NOT_LINES), dtype=np.uint8).copy()
+    out[out != 10] = np.frombuffer(letters, dtype=np.uint8)
+    return out.tobytes()
+
+def shift_lines(k, text, decrypt=False, offset=0, variant=VIGENERE):
+    """Like shift, but newlines are copied through and consume no key letter."""
+    return newlines(shift(k, text, decrypt, offset, variant), text)
+
+def preserve_chunk(k, text, decrypt=False, offset=0, variant=VIGENERE):
+    """Apply the key to the letters of text in place: case, whitespace and
+    punctuation stay where they are and consume no key letter."""
+    return alphabet.restore(shift(k, text, decrypt, offset, variant), text)
+
+def preserve(k, chunks, decrypt=False, variant=VIGENERE):
+    """Format-preserving cipher over an iterable of raw chunks, yielding
+    each processed chunk; the key phase carries across chunks."""
+    step = keyer(k, decrypt, variant)
+    for chunk in chunks:
+        yield alphabet.restore(step(alphabet.encode(chunk)), chunk)
+
+CHUNK_SIZE = 1 << 20
+OUT_BUFSIZE = 1 << 22
+
+def chunks(fin, chunk_size=CHUNK_SIZE):
+    """Fixed-size chunks of a file until it is exhausted."""
+    return iter(lambda: fin.read(chunk_size), b'')
+
+def stream(k, fin, fout, decrypt=False, chunk_size=CHUNK_SIZE, keep_format=False, variant=VIGENERE):
+    """Process fin into fout in fixed-size chunks, keeping the key phase
+    across chunk boundaries. Newlines are copied through and other
+    non-letters dropped, or all kept in place with keep_format. Returns
+    the number of bytes read."""
+    step = keyer(k, decrypt, variant)
+    total = 0
+    for chunk in chunks(fin, chunk_size):
+        letters = step(alphabet.encode(chunk))
+        fout.write(alphabet.restore(letters, chunk) if keep_format else newlines(letters, chunk))
+        total += len(chunk)
+    return total
+
+def parallel_stream(k, fin, fout, decrypt=False, chunk_size=CHUNK_SIZE, workers=None, keep_format=False, variant=VIGENERE):
+    """stream() over a process pool. Raw chunks are sent to the workers,
+    which normalize them; a chunk's key offset is known from the letter
+    count of the chunks before it, so chunks are independent; results are written back in
+    order and at most two chunks per worker are in flight. Autokey chunks
+    depend on the plaintext before them and cannot be run this way."""
+    if variant == AUTOKEY:
+        raise ValueError("autokey chunks cannot be processed in parallel")
+    from multiprocessing import Pool, cpu_count
+    from collections import deque
+    workers = workers or cpu_count()
+    pool = Pool(workers)
+    pending = deque()
+    offset = total = 0
+    try:
+        for chunk in chunks(fin, chunk_size):
+            job = preserve_chunk if keep_format else shift_lines
+            pending.append(pool.apply_async(job, (k, chunk, decrypt, offset, variant)))
+            # the next offset only needs the letter count, not the codes
+            offset += len(chunk.translate(None, alphabet.NONLETTERS))
+            total += len(chunk)
+            if len(pending) >= 2 * workers:
+                fout.write(pending.popleft().get())
+        while pending:
+            fout.write(pending.popleft().get())
+    finally:
+        pool.terminate()
+    return total
 
-    from itertools import cycle
-    ki=cycle(k)
-    p=""
-    for ci in c:
-        p = p + chr(65 + (( ord(ci) - 65 ) - ( ord(next(ki)) - 65 )) % 26)
-    return p
+def by_line(k, fin, fout, decrypt=False, variant=VIGENERE):
+    """Process fin one line at a time, restarting the key on every line."""
+    for line in fin:
+        fout.write(shift(k, line, decrypt, variant=variant) + b'\n')
 
 def test(plain="MAKEITHAPPEN",key="MATH",cipher="YADLUTAHBPXU"):
-    print "Key: ", key
-    print "Plain:  ", plain
-    print "vce:    ", vce(key, plain)
-    print "Cipher: ", cipher
-    print "vcd:    ", vcd(key,cipher)
-    print "-+-"
+    print("Key: ", key)
+    print("Plain:  ", plain)
+    print("vce:    ", vce(key, plain))
+    print("Cipher: ", cipher)
+    print("vcd:    ", vcd(key,cipher))
+    print("-+-")
 
 def main():
     description = "Vigenere cipher"
@@ -36,8 +239,18 @@ def main():
     parser.add_argument('--oper', choices=['e', 'd'], help="encrypt or decrypt")
     parser.add_argument('-k', metavar='key', help='cipher key', required=True)
     parser.add_argument('-p', metavar='plain', help='plain text')
-    parser.add_argument('-i', metavar='in-file', type=argparse.FileType('rt'), help='the file to process')
+    parser.add_argument('-i', metavar='in-file', type=argparse.FileType('rb'), help='the file to process')
+    parser.add_argument('-o', metavar='out-file', type=argparse.FileType('wb', OUT_BUFSIZE), default=sys.stdout.buffer, help='where to write the result (default: stdout)')
+    parser.add_argument('--chunk-size', metavar='bytes', type=int, default=CHUNK_SIZE, help='bytes read per chunk in streaming mode')
+    parser.add_argument('--reset-lines', dest='reset_lines', action='store_true', help='restart the key on every line (old behaviour)')
+    parser.add_argument('--preserve', dest='keep_format', action='store_true', help='keep case, spacing and punctuation in place; the key advances on letters only')
+    parser.add_argument('--workers', metavar='N', type=int, default=1, help='process chunks in a pool of N processes (0: one per core)')
+    parser.add_argument('--variant', choices=VARIANTS, default=VIGENERE, help='cipher variant (default: vigenere)')
     args = parser.parse_args()
+    if args.reset_lines and (args.workers != 1 or args.keep_format):
+        parser.error('--workers and --preserve cannot be combined with --reset-lines')
+    if args.variant == AUTOKEY and args.workers != 1:
+        parser.error('autokey chunks depend on each other: --workers cannot be used')
 
     if args.test:
         test(plain="VIGENERE", key="CRYPT",cipher="XZETGGIC")
@@ -45,8 +258,14 @@ def main():
         test(plain=args.p, key=args.k, cipher="")
         return test()
 
-    for i, line in enumerate(args.i):
-        print vcd(args.k,line[:-1]) if args.oper == 'd' else vce(args.k,line[:-1])
+    decrypt = args.oper == 'd'
+    if args.reset_lines:
+        by_line(args.k, args.i, args.o, decrypt, args.variant)
+    elif args.workers != 1:
+        parallel_stream(args.k, args.i, args.o, decrypt, args.chunk_size, args.workers, args.keep_format, args.variant)
+    else:
+        stream(args.k, args.i, args.o, decrypt, args.chunk_size, args.keep_format, args.variant)
+    args.o.flush()
 
 if __name__ == "__main__":
    main()